@@ -0,0 +1,312 @@
+import argparse
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import custom_functions
+
+######################
+# Local HTTP API for the VM Right Sizing analysis (runs without streamlit, standard library HTTP server)
+# Usage: python api_service.py --port 8765 --workers 4
+#   POST /jobs?performance_type=95th%20Percentile&power_state=poweredOn   (body: Collector xlsx) -> 202 {"job_id": ...}
+#   GET  /jobs/<job_id>               status (queued / running / done / failed) & overview numbers
+#   GET  /jobs/<job_id>/result        overview, savings & per VM recommendations as json
+#   GET  /jobs/<job_id>/report.xlsx   excel report (same as the download in the WebApp)
+#   GET  /jobs/<job_id>/vm_details.csv | vm_details.csv.gz | vm_details.parquet   per VM recommendations, streamed in chunks
+#   DELETE /jobs/<job_id>             cancel a queued job / forget a finished job
+#   GET  /health                      workers, queue & job counters
+######################
+
+max_upload_bytes = int(os.environ.get("VM_RIGHT_SIZING_API_MAX_UPLOAD_MB", "200")) * 1024 * 1024
+# streamed exports of the per VM recommendations: file name -> export format & content type
+vm_details_exports = {
+    'vm_details.csv': ('csv', 'text/csv'),
+    'vm_details.csv.gz': ('csv.gz', 'application/gzip'),
+    'vm_details.parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+# results of older finished jobs are dropped above this total size or number of jobs (the newest result is always kept)
+max_result_bytes = int(os.environ.get("VM_RIGHT_SIZING_API_MAX_RESULT_MB", "512")) * 1024 * 1024
+max_finished_jobs = int(os.environ.get("VM_RIGHT_SIZING_API_MAX_FINISHED_JOBS", "100"))
+# worker processes are not forked from the multi-threaded server (a lock held by a request thread would be inherited locked)
+job_process_context = multiprocessing.get_context('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+
+# Analyse a single uploaded Collector export - runs inside a worker process
+def run_analysis_job(file_bytes, powerstate_selected, performance_type_selected):
+
+    warnings.simplefilter("ignore") # Ignore openpyxl Excile File Warning while reading (no default style)
+    from io import BytesIO
+    custom_functions.sheet_parse_workers = 1 # jobs are already spread across worker processes
+
+    timings = {}
+    start_time = time.perf_counter()
+    main_df = custom_functions.get_data_from_excel(BytesIO(file_bytes))
+    timings['parse'] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    custom_df = main_df.query("`Power State`==@powerstate_selected") if powerstate_selected else main_df
+    vCPU_overview = custom_functions.generate_vCPU_overview_df(custom_df)
+    vMemory_overview = custom_functions.generate_vMemory_overview_df(custom_df)
+    savings_vCPU, savings_vMemory = custom_functions.get_savings_value(performance_type_selected, vCPU_overview, vMemory_overview.data)
+    timings['overview'] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    default_columns = custom_functions.get_default_columns_to_show(performance_type_selected, custom_df.columns)
+    vm_detail_columns_to_show = list(custom_df.columns[default_columns])
+    output_to_show = custom_functions.generate_results_df_for_output(custom_df, vm_detail_columns_to_show)
+    excel_report = custom_functions.download_as_excel(output_to_show, vCPU_overview, vMemory_overview)
+    timings['report'] = time.perf_counter() - start_time
+
+    summary = {
+        'clusters': int(custom_df['Cluster Name'].nunique()),
+        'vms': int(custom_df.shape[0]),
+        'performance_type': performance_type_selected,
+        'power_states': powerstate_selected,
+        'vCPU_overview': {row_name: int(value) for row_name, value in vCPU_overview.itertuples(index=False)},
+        'vMemory_overview': {row_name: round(float(value), 2) if value == value else None for row_name, value in vMemory_overview.data.itertuples(index=False)}, # NaN -> null
+        'savings': {'vCPUs': savings_vCPU, 'vMemory_GiB': savings_vMemory},
+        'seconds': {stage: round(seconds, 3) for stage, seconds in timings.items()},
+    }
+    vm_details_json = custom_df[vm_detail_columns_to_show].reset_index().to_json(orient='records', double_precision=2)
+    result_json = '{{"summary": {}, "vm_details": {}}}'.format(json.dumps(summary), vm_details_json).encode('utf-8')
+    vm_details_parquet = b"".join(custom_functions.generate_export_chunks(custom_df[vm_detail_columns_to_show], 'parquet'))
+
+    # only serialized results are kept - one form per output (json result, excel report, parquet source of the vm details exports)
+    return {'summary': summary, 'result_json': result_json, 'excel_report': excel_report, 'vm_details_parquet': vm_details_parquet}
+
+# Job registry & bounded worker pool - jobs beyond workers + max_queued_jobs are rejected (HTTP 503) instead of piling up
+def create_job_service(workers=None, max_queued_jobs=16):
+
+    workers = workers or os.cpu_count() or 1
+    return {
+        'executor': ProcessPoolExecutor(max_workers=workers, mp_context=job_process_context),
+        'workers': workers,
+        'max_queued_jobs': max_queued_jobs,
+        'jobs': {},
+        'lock': threading.Lock(),
+        'counters': {'submitted': 0, 'rejected': 0, 'done': 0, 'failed': 0},
+    }
+
+# Submit a job, returns the job or None if the queue is full
+def submit_job(job_service, file_bytes, powerstate_selected, performance_type_selected):
+
+    with job_service['lock']:
+        pending_jobs = sum(1 for job in job_service['jobs'].values() if not job['future'].done())
+        if pending_jobs >= job_service['workers'] + job_service['max_queued_jobs']:
+            job_service['counters']['rejected'] += 1
+            return None
+        job = {'job_id': uuid.uuid4().hex, 'submitted': time.time(), 'finished': None, 'bytes': len(file_bytes), 'result_bytes': 0}
+        job['future'] = job_service['executor'].submit(run_analysis_job, file_bytes, powerstate_selected, performance_type_selected)
+        job_service['jobs'][job['job_id']] = job
+        job_service['counters']['submitted'] += 1
+    job['future'].add_done_callback(lambda future: finish_job(job_service, job))
+
+    return job
+
+# Bookkeeping when a job is done: counters & dropping the oldest finished jobs (done, failed or cancelled) while there are more
+# than max_finished_jobs or their results exceed max_result_bytes - the job that just finished is kept, even if its result alone is larger
+def finish_job(job_service, job):
+
+    with job_service['lock']:
+        job['finished'] = time.time()
+        if not job['future'].cancelled():
+            failed = job['future'].exception() is not None
+            job_service['counters']['failed' if failed else 'done'] += 1
+            if not failed:
+                job['result_bytes'] = sum(len(value) for value in job['future'].result().values() if isinstance(value, bytes))
+        finished_jobs = sorted((finished_job for finished_job in job_service['jobs'].values() if finished_job['finished'] is not None and finished_job is not job), key=lambda finished_job: finished_job['finished'])
+        stored_jobs = len(finished_jobs) + 1
+        stored_bytes = sum(finished_job['result_bytes'] for finished_job in finished_jobs) + job['result_bytes']
+        for finished_job in finished_jobs:
+            if stored_jobs <= max_finished_jobs and stored_bytes <= max_result_bytes:
+                break
+            stored_jobs -= 1
+            stored_bytes -= finished_job['result_bytes']
+            del job_service['jobs'][finished_job['job_id']]
+
+# Status of a job as json-able dict (overview numbers included once the job is done)
+def get_job_status(job):
+
+    future = job['future']
+    if future.cancelled():
+        status = 'cancelled'
+    elif not future.done():
+        status = 'running' if future.running() else 'queued'
+    elif future.exception() is not None:
+        status = 'failed'
+    else:
+        status = 'done'
+
+    job_status = {'job_id': job['job_id'], 'status': status, 'submitted': job['submitted'], 'finished': job['finished']}
+    if status == 'failed':
+        job_status['error'] = type(future.exception()).__name__ + ": " + str(future.exception())
+    if status == 'done':
+        job_status['summary'] = future.result()['summary']
+
+    return job_status
+
+class ApiRequestHandler(BaseHTTPRequestHandler):
+
+    job_service = None # set by create_server
+    protocol_version = "HTTP/1.1" # keep-alive for clients polling the job status
+
+    def do_POST(self):
+
+        # the body is read first - an unread body on a keep-alive connection would be parsed as the next request
+        content_length = int(self.headers.get('Content-Length') or 0)
+        if content_length > max_upload_bytes:
+            self.close_connection = True # the body is not read, it must not be parsed as the next request
+            return self.send_json(413, {'error': 'file larger than {} MiB'.format(max_upload_bytes // 1024 // 1024)}, {'Connection': 'close'})
+        file_bytes = self.rfile.read(content_length) if content_length > 0 else b""
+
+        url = urlparse(self.path)
+        if url.path.rstrip('/') != '/jobs':
+            return self.send_json(404, {'error': 'not found'})
+        query = parse_qs(url.query)
+        performance_type_selected = query.get('performance_type', ['95th Percentile'])[0]
+        if performance_type_selected not in custom_functions.performance_types:
+            return self.send_json(400, {'error': 'performance_type must be one of: ' + ", ".join(custom_functions.performance_types)})
+        powerstate_selected = query.get('power_state', ['poweredOn'])
+        if 'all' in powerstate_selected:
+            powerstate_selected = None
+        if not file_bytes:
+            return self.send_json(400, {'error': 'request body must contain the Collector xlsx file'})
+
+        job = submit_job(self.job_service, file_bytes, powerstate_selected, performance_type_selected)
+        if job is None:
+            return self.send_json(503, {'error': 'queue is full, retry later'}, {'Retry-After': '5'})
+        self.send_json(202, {'job_id': job['job_id'], 'status': 'queued', 'status_url': '/jobs/' + job['job_id']}, {'Location': '/jobs/' + job['job_id']})
+
+    def do_GET(self):
+
+        path_parts = [part for part in urlparse(self.path).path.split('/') if part]
+        if path_parts == ['health']:
+            return self.send_json(200, self.get_health())
+        job = self.get_job(path_parts)
+        if job is None:
+            return self.send_json(404, {'error': 'unknown job'})
+        job_status = get_job_status(job)
+        if len(path_parts) == 2:
+            return self.send_json(200, job_status)
+        if job_status['status'] != 'done':
+            return self.send_json(409, job_status) # result not available (yet)
+        result = job['future'].result()
+        if path_parts[2] == 'result':
+            return self.send_bytes(200, result['result_json'], 'application/json')
+        if path_parts[2] == 'report.xlsx':
+            return self.send_bytes(200, result['excel_report'], 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', {'Content-Disposition': 'attachment; filename="VM_Right_Sizing_Analyse.xlsx"'})
+        if path_parts[2] in vm_details_exports:
+            export_format, content_type = vm_details_exports[path_parts[2]]
+            content_disposition = {'Content-Disposition': 'attachment; filename="VM_Right_Sizing_' + path_parts[2] + '"'}
+            if export_format == 'parquet':
+                return self.send_bytes(200, result['vm_details_parquet'], content_type, content_disposition)
+            from io import BytesIO
+            import pandas as pd
+            return self.send_stream(200, custom_functions.generate_export_chunks(pd.read_parquet(BytesIO(result['vm_details_parquet'])), export_format), content_type, content_disposition)
+        self.send_json(404, {'error': 'not found'})
+
+    def do_DELETE(self):
+
+        path_parts = [part for part in urlparse(self.path).path.split('/') if part]
+        job = self.get_job(path_parts) if len(path_parts) == 2 else None
+        if job is None:
+            return self.send_json(404, {'error': 'unknown job'})
+        if not job['future'].done() and not job['future'].cancel():
+            return self.send_json(409, {'error': 'job is already running'})
+        with self.job_service['lock']:
+            self.job_service['jobs'].pop(job['job_id'], None)
+        self.send_json(200, {'job_id': job['job_id'], 'status': 'deleted'})
+
+    def get_job(self, path_parts):
+        if len(path_parts) < 2 or path_parts[0] != 'jobs':
+            return None
+        with self.job_service['lock']:
+            return self.job_service['jobs'].get(path_parts[1])
+
+    def get_health(self):
+        with self.job_service['lock']:
+            jobs = list(self.job_service['jobs'].values())
+            counters = dict(self.job_service['counters'])
+        return {
+            'workers': self.job_service['workers'],
+            'max_queued_jobs': self.job_service['max_queued_jobs'],
+            'pending_jobs': sum(1 for job in jobs if not job['future'].done()),
+            'stored_jobs': len(jobs),
+            'stored_result_bytes': sum(job['result_bytes'] for job in jobs),
+            'counters': counters,
+        }
+
+    def send_json(self, status_code, data, headers=None):
+        self.send_bytes(status_code, json.dumps(data).encode('utf-8'), 'application/json', headers)
+
+    def send_bytes(self, status_code, body, content_type, headers=None):
+        self.send_response(status_code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for header, value in (headers or {}).items():
+            self.send_header(header, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    # Send a generated body chunk by chunk - the length is not known upfront, so HTTP/1.1 chunked transfer encoding marks the end of the body
+    def send_stream(self, status_code, chunks, content_type, headers=None):
+        self.send_response(status_code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Transfer-Encoding', 'chunked')
+        for header, value in (headers or {}).items():
+            self.send_header(header, value)
+        self.end_headers()
+        for chunk in chunks:
+            if chunk:
+                self.wfile.write(b"%x\r\n" % len(chunk))
+                self.wfile.write(chunk)
+                self.wfile.write(b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+# Create (not yet started) server - port 0 picks a free port, see server.server_address
+def create_server(host='127.0.0.1', port=8765, workers=None, max_queued_jobs=16, quiet=False):
+
+    request_handler = type('BoundApiRequestHandler', (ApiRequestHandler,), {'job_service': create_job_service(workers, max_queued_jobs)})
+    server = ThreadingHTTPServer((host, port), request_handler)
+    server.daemon_threads = True
+    server.quiet = quiet
+
+    return server
+
+# Stop serving and shut down the worker processes
+def shutdown_server(server):
+    server.shutdown()
+    server.server_close()
+    server.RequestHandlerClass.job_service['executor'].shutdown(wait=False, cancel_futures=True)
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Local HTTP API for the VM Right Sizing analysis of Nutanix Collector exports.")
+    parser.add_argument('--host', default='127.0.0.1', help='interface to listen on (default: 127.0.0.1, localhost only)')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('-w', '--workers', type=int, default=None, help='number of worker processes (default: number of CPUs)')
+    parser.add_argument('-q', '--max-queued-jobs', type=int, default=16, help='jobs waiting for a worker before new submissions are rejected with 503 (default: 16)')
+    parser.add_argument('--quiet', action='store_true', help='do not log every request')
+    args = parser.parse_args(argv)
+
+    server = create_server(args.host, args.port, args.workers, args.max_queued_jobs, args.quiet)
+    print("VM Right Sizing API listening on http://{}:{} ({} workers)".format(server.server_address[0], server.server_address[1], server.RequestHandlerClass.job_service['workers']), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shutdown_server(server)
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,13 @@
-import plotly.express as px
-import plotly.graph_objs as go
 import streamlit as st  # pip install streamlit
 import custom_functions
+import percentile_sketches
+import consolidation_planner
+import export_diff
 import pandas as pd
 import numpy as np
-from PIL import Image
+import functools
 import warnings
+import uuid
 import time
 from datetime import date
 
@@ -20,8 +22,11 @@ warnings.simplefilter("ignore") # Ignore openpyxl Excile File Warning while read
 ######################
 # Initialize variables
 ######################
-custom_df = pd.DataFrame() # Initialize Main Dataframe as Empty in order to check whether it has been filled
+selected_vms = np.zeros(0, dtype=bool) # Initialize filter mask as empty in order to check whether a dataset has been loaded
 filter_form_submitted = False
+if 'session_id' not in st.session_state:
+    st.session_state['session_id'] = uuid.uuid4().hex[:12] # identifies the session in the diagnostics log lines
+instrumentation_records = custom_functions.start_instrumentation(st.session_state['session_id']) # only records if VM_RIGHT_SIZING_DIAGNOSTICS=1
 
 ######################
 # Page sections
@@ -42,8 +47,43 @@ with st.sidebar:
             #if uploaded_file.name not in st.session_state:
             #    custom_functions.upload_to_aws(uploaded_file)
 
-            # load excel, filter our relevant tabs and columns, merge all in one dataframe
-            main_df = custom_functions.get_data_from_excel(uploaded_file)            
+            # load excel, filter our relevant tabs and columns, merge all in one dataframe - parsed in the background, a new upload cancels the running parse
+            parse_job = st.session_state.get('parse_job')
+            upload_hashes = st.session_state.setdefault('upload_hashes', {}) # every upload is only hashed once, not on every rerun
+            upload_hash = custom_functions.get_upload_hash(uploaded_file, upload_hashes)
+            if parse_job is None or parse_job['file_hash'] != upload_hash:
+                if parse_job is not None:
+                    custom_functions.cancel_background_parse(parse_job)
+                parse_job = st.session_state['parse_job'] = custom_functions.start_background_parse(uploaded_file, upload_hash)
+            if not parse_job['future'].done():
+                parse_progress_section = st.sidebar.empty()
+                while not parse_job['future'].done(): # every widget interaction / new upload interrupts this loop with a rerun
+                    with parse_progress_section.container():
+                        if not parse_job['future'].running(): # all background parses are busy with uploads of other sessions
+                            st.markdown('Excel Datei wartet auf das Einlesen (andere Uploads werden gerade verarbeitet)...')
+                        else:
+                            st.markdown('Excel Datei wird eingelesen...')
+                            for sheet_name in ['vInfo', 'vCPU', 'vMemory']:
+                                rows, total_rows = parse_job['progress'].get(sheet_name, (0, None))
+                                st.progress(min(int(rows / total_rows * 100), 100) if total_rows else 0)
+                                st.caption("{}: {} Zeilen".format(sheet_name, rows) + (" von {}".format(total_rows) if total_rows else ""))
+                    time.sleep(0.25)
+                parse_progress_section.empty()
+            if parse_job['future'].exception() is not None: # a failed parse is not kept - uploading the file again retries it
+                st.session_state.pop('parse_job')
+            main_df = parse_job['future'].result()
+            if not parse_job.get('records_reported'): # parse runs once per upload, its diagnostics are shown with the run it finished in
+                instrumentation_records.extend(parse_job['records'])
+                parse_job['records_reported'] = True
+
+            # optional raw performance samples - allow any percentile (e.g. P90 / P99) in addition to the Collector values
+            performance_type_options = ['95th Percentile','Peak','Average','Median']
+            samples_file = st.sidebar.file_uploader(label="Optional: Performance Rohdaten (CSV) für eigene Perzentile.", type=['csv', 'gz'], help='CSV Datei mit einer Zeile je VM und 30 Minuten Intervall und den Spalten "MOID", "CPU %" und "Memory %" (auch gzip komprimiert).')
+            if samples_file is not None:
+                custom_percentile = st.sidebar.number_input('Eigenes Perzentil:', min_value=1.0, max_value=100.0, value=90.0, step=1.0, help='Wird aus den Rohdaten je VM berechnet und wie die Collector Werte mit 20% Puffer ausgewertet.')
+                sketches = percentile_sketches.get_percentile_sketches(samples_file, main_df, custom_functions.get_upload_hash(samples_file, upload_hashes))
+                main_df = percentile_sketches.get_custom_percentile_df(main_df, sketches, custom_percentile)
+                performance_type_options.insert(0, percentile_sketches.get_percentile_performance_type(custom_percentile))
                
             st.sidebar.markdown('## **Filter**')
 
@@ -60,7 +100,7 @@ with st.sidebar:
             )
 
             performance_type_selected = st.sidebar.selectbox(
-                'Performance Vergleichswerte:', ('95th Percentile','Peak','Average','Median'),
+                'Performance Vergleichswerte:', performance_type_options,
                 help='Wählen Sie den zu Vergleichzwecken betrachtenden Performance Typ (95th Percentile ist empfohlen).'
             )
 
@@ -68,8 +108,19 @@ with st.sidebar:
             #    slack_string = 'Collector VM Right Sizing: '+str(main_df['Cluster Name'].nunique())+' Cluster, '+str(main_df.shape[0])+' VMs.'
             #    custom_functions.send_slack_message_and_set_session_state(slack_string,uploaded_file)
 
+            # Stages below are nodes of the session's computation graph - a rerun only recomputes the nodes whose inputs changed
+            computation_graph = st.session_state.setdefault('computation_graph', custom_functions.create_computation_graph())
+            computation_inputs = custom_functions.get_computation_inputs(main_df, vCluster_selected, powerstate_selected, performance_type_selected)
+
             # Apply Multiselect Filter to dataframe
-            custom_df = main_df.query("`Cluster Name`==@vCluster_selected").query("`Power State`==@powerstate_selected")            
+            # (the session only keeps the boolean mask - the filtered rows are copied on demand, if a stage has to be recomputed, and dropped after the rerun)
+            with custom_functions.instrumentation_section('filter', main_df.shape[0]) as filter_record:
+                selected_vms = custom_functions.compute_node(computation_graph, computation_inputs, 'selected_vms', custom_functions.get_selected_vms, main_df, vCluster_selected, powerstate_selected) # boolean mask, no query parsing
+                filter_record['rows_out'] = int(selected_vms.sum())
+            get_custom_df = functools.lru_cache(maxsize=None)(functools.partial(custom_functions.get_filtered_df, main_df, selected_vms))
+
+            # Apply Multiselect Filter to pre-aggregated cube (used for overview, savings & histograms)
+            aggregation_cube_selected, histogram_cube_selected = custom_functions.compute_node(computation_graph, computation_inputs, 'aggregation_cube_selected', lambda: tuple(custom_functions.filter_aggregation_cube(cube_df, vCluster_selected, powerstate_selected) for cube_df in custom_functions.get_aggregation_cube(main_df)))
 
         except Exception as e:             
             content_section.error("##### FEHLER: Die hochgeladene Excel Datei konnte leider nicht ausgelesen werden.")
@@ -100,6 +151,9 @@ with st.sidebar:
             content_section.exception(e)
             st.session_state[uploaded_file.name] = True 
             custom_functions.send_slack_message_and_set_session_state('Collector VM Right Sizing ERROR: '+str(e.args),uploaded_file)
+    elif 'parse_job' in st.session_state: # upload removed - stop a running parse & release the dataframe
+        custom_functions.cancel_background_parse(st.session_state.pop('parse_job'))
+        st.session_state.pop('computation_graph', None)
 
 with header_section:
     
@@ -115,12 +169,13 @@ with header_section:
 
 with content_section: 
 
-    if not custom_df.empty:
-        st.success("##### Die folgende Nutanix Collector Auswertung umfasst {}".format(custom_df['Cluster Name'].nunique())+" Cluster und {}".format(custom_df.shape[0])+" VMs.")
+    if selected_vms.any():
+        cluster_count, vm_count = custom_functions.compute_node(computation_graph, computation_inputs, 'vm_summary', lambda: (main_df['Cluster Name'][selected_vms].nunique(), int(selected_vms.sum())))
+        st.success("##### Die folgende Nutanix Collector Auswertung umfasst {}".format(cluster_count)+" Cluster und {}".format(vm_count)+" VMs.")
 
         # Generate Overview Dataframes for vCPU & vMemory
-        vCPU_overview = custom_functions.generate_vCPU_overview_df(custom_df)
-        vMemory_overview = custom_functions.generate_vMemory_overview_df(custom_df)
+        vCPU_overview = custom_functions.compute_node(computation_graph, computation_inputs, 'vCPU_overview', custom_functions.generate_vCPU_overview_df, aggregation_cube_selected)
+        vMemory_overview = custom_functions.compute_node(computation_graph, computation_inputs, 'vMemory_overview', custom_functions.generate_vMemory_overview_df, aggregation_cube_selected)
 
         # Generate 2 Main Columns
         column_1, column_2 = st.columns(2)
@@ -138,7 +193,7 @@ with content_section:
             st.table(vCPU_overview)
 
         with column_2_1:        
-            bar_chart_vCPU, vCPU_bar_chart_config = custom_functions.generate_bar_charts(vCPU_overview,"vCPU")
+            bar_chart_vCPU, vCPU_bar_chart_config = custom_functions.compute_node(computation_graph, computation_inputs, 'bar_chart_vCPU', custom_functions.get_cached_chart, custom_functions.get_figure_cache_key(main_df, vCluster_selected, powerstate_selected, None, "vCPU", "bar"), custom_functions.generate_bar_charts, vCPU_overview, "vCPU")
             st.plotly_chart(bar_chart_vCPU,use_container_width=True, config=vCPU_bar_chart_config)
 
         with column_3_1:
@@ -147,12 +202,63 @@ with content_section:
             st.table(vMemory_overview)
 
         with column_4_1:
-            bar_chart_vMemory, vMemory_bar_chart_config = custom_functions.generate_bar_charts(vMemory_overview.data,"GiB")
+            bar_chart_vMemory, vMemory_bar_chart_config = custom_functions.compute_node(computation_graph, computation_inputs, 'bar_chart_vMemory', custom_functions.get_cached_chart, custom_functions.get_figure_cache_key(main_df, vCluster_selected, powerstate_selected, None, "vMemory", "bar"), custom_functions.generate_bar_charts, vMemory_overview.data, "GiB")
             st.plotly_chart(bar_chart_vMemory,use_container_width=True, config=vMemory_bar_chart_config)
 
         # Main Section for VM Details
-        savings_vCPU, savings_vMemory = custom_functions.get_savings_value(performance_type_selected,vCPU_overview,vMemory_overview.data)
+        savings_vCPU, savings_vMemory = custom_functions.compute_node(computation_graph, computation_inputs, 'savings', custom_functions.get_savings_value, performance_type_selected,vCPU_overview,vMemory_overview.data)
         st.markdown(f"<h5 style='text-align: center; color:#034EA2;'> In Summe besteht ein mögliches VM Optimierungs-Potenzial von {savings_vCPU} vCPUs und {savings_vMemory} GiB Memory (basierend auf 'Provisioned' vs '{performance_type_selected}' Ressourcen-Bedarf).</h5>", unsafe_allow_html=True)
+
+        # What-if: savings for all buffer factors & performance types at once
+        what_if_expander = st.expander(label='What-if Analyse: Puffer & Performance Typ')
+        with what_if_expander:
+            st.markdown("Mögliches Optimierungs-Potenzial abhängig vom Puffer auf die gemessene Auslastung (1.0 = kein Puffer, 1.2 = 20% Puffer wie in allen anderen Werten dieser Seite) für alle Performance Typen.")
+            what_if_df = custom_functions.compute_node(computation_graph, computation_inputs, 'what_if_df', lambda: custom_functions.generate_what_if_sweep(get_custom_df()))
+            column_1_w, column_2_w = st.columns(2)
+            with column_1_w:
+                what_if_chart_vCPU, what_if_chart_vCPU_config = custom_functions.compute_node(computation_graph, computation_inputs, 'what_if_chart_vCPU', custom_functions.get_cached_chart, custom_functions.get_figure_cache_key(main_df, vCluster_selected, powerstate_selected, None, "vCPU", "what_if"), custom_functions.generate_what_if_charts, what_if_df, "vCPU")
+                st.plotly_chart(what_if_chart_vCPU, use_container_width=True, config=what_if_chart_vCPU_config)
+            with column_2_w:
+                what_if_chart_vMemory, what_if_chart_vMemory_config = custom_functions.compute_node(computation_graph, computation_inputs, 'what_if_chart_vMemory', custom_functions.get_cached_chart, custom_functions.get_figure_cache_key(main_df, vCluster_selected, powerstate_selected, None, "vMemory", "what_if"), custom_functions.generate_what_if_charts, what_if_df, "vMemory")
+                st.plotly_chart(what_if_chart_vMemory, use_container_width=True, config=what_if_chart_vMemory_config)
+
+        # Node consolidation: nodes of a given profile needed per cluster for provisioned vs right sized VMs
+        consolidation_expander = st.expander(label='Node Konsolidierung: Anzahl benötigter Nodes je Cluster')
+        with consolidation_expander:
+            st.markdown("Die VMs jedes Clusters werden (First-Fit-Decreasing nach vCPU & vMemory) auf Nodes des folgenden Profils verteilt - einmal mit den provisionierten und einmal mit den '{}' Ressourcen.".format(performance_type_selected))
+            column_1_n, column_2_n, column_3_n, column_4_n = st.columns(4)
+            node_cores = column_1_n.number_input('Cores je Node:', min_value=1, value=consolidation_planner.default_node_cores, step=1)
+            node_memory_gib = column_2_n.number_input('RAM je Node (GiB):', min_value=1, value=consolidation_planner.default_node_memory_gib, step=64)
+            cpu_overcommit = column_3_n.number_input('vCPU:pCore Verhältnis:', min_value=0.5, value=consolidation_planner.default_cpu_overcommit, step=0.5)
+            reserve_nodes = column_4_n.number_input('Reserve Nodes je Cluster (N+x):', min_value=0, value=consolidation_planner.default_reserve_nodes, step=1)
+            computation_inputs['node_profile'] = (node_cores, node_memory_gib, cpu_overcommit, reserve_nodes)
+            consolidation_plan_df = custom_functions.compute_node(computation_graph, computation_inputs, 'consolidation_plan', lambda: consolidation_planner.plan_node_consolidation(get_custom_df(), performance_type_selected, node_cores, node_memory_gib, cpu_overcommit, reserve_nodes))
+            st.markdown("**In Summe {} Nodes provisioniert vs {} Nodes right-sized ({} Nodes weniger).**".format(consolidation_plan_df['Nodes Provisioned'].sum(), consolidation_plan_df['Nodes Right-Sized'].sum(), consolidation_plan_df['Nodes Saved'].sum()))
+            if consolidation_plan_df['VMs too large Right-Sized'].sum() > 0 or consolidation_plan_df['VMs too large Provisioned'].sum() > 0:
+                st.warning("Einige VMs sind größer als ein Node und wurden nicht berücksichtigt (siehe Spalten 'VMs too large').")
+            st.dataframe(consolidation_plan_df)
+
+        # Before / after comparison with an earlier export of the same environment (joined on MOID)
+        export_diff_expander = st.expander(label='Vorher / Nachher Vergleich mit einem früheren Collector Export')
+        with export_diff_expander:
+            st.markdown("Vergleicht diesen Export mit einem früheren Export derselben Umgebung (z.B. vor dem Right Sizing) je VM (anhand der MOID) und je Cluster: welche VMs hinzugekommen, entfernt oder in der Größe verändert wurden und wie sich provisionierte Ressourcen und der '{}' Bedarf entwickelt haben.".format(performance_type_selected))
+            before_file = st.file_uploader(label="Früheren Collector Export hochladen:", type=['xlsx'], key='before_file')
+            if before_file is not None:
+                with st.spinner('Früherer Export wird eingelesen...'):
+                    before_df = custom_functions.get_data_from_excel(before_file, file_hash=custom_functions.get_upload_hash(before_file, upload_hashes))
+                diff_performance_type = performance_type_selected if 'vCPU ' + performance_type_selected + ' #' in before_df.columns else '95th Percentile' # custom percentiles only exist for this export
+                vm_diff_df, cluster_diff_df = export_diff.get_export_diff(before_df, main_df, diff_performance_type)
+                vm_status_counts = vm_diff_df['Status'].value_counts()
+                st.markdown("**{} VMs hinzugekommen, {} VMs entfernt, {} VMs in der Größe verändert, {} VMs unverändert.**".format(vm_status_counts['added'], vm_status_counts['removed'], vm_status_counts['resized'], vm_status_counts['unchanged']))
+                st.dataframe(cluster_diff_df)
+                changed_vms_df = vm_diff_df[vm_diff_df['Status'] != 'unchanged']
+                st.dataframe(changed_vms_df.head(custom_functions.vm_details_page_rows * 10).style.format(precision=2, na_rep='nicht vorhanden'))
+                st.caption("{} von {} veränderten VMs angezeigt - alle VMs sind im CSV Download enthalten.".format(min(len(changed_vms_df), custom_functions.vm_details_page_rows * 10), len(changed_vms_df)))
+                with st.form(key='export_diff_download_form'):
+                    export_diff_submit = st.form_submit_button('VM Vergleich als CSV herunterladen?')
+                if export_diff_submit:
+                    st.download_button(label='⏬ Download', data=vm_diff_df.to_csv().encode('utf-8'), file_name='VM_Right_Sizing_Vergleich.csv')
+
         st.markdown("<h4 style='text-align: center; color:#000000; background-color: #F5F5F5;'>vCPU & vMemory Auslastungs-Verteilung:</h4><br />", unsafe_allow_html=True)
         st.markdown("Die folgenden Diagramme geben einen Überblick wie sich die einzelnen VMs hinsichtlich Ihrer prozentual verwendeten vs Ihrer zugewiesenen Ressourcen verhalten. **Es steht jeweils ein Diagramm bereit welches die VM Auslastung im Bezug zur Anzahl der VMs setzt und zum anderen im Bezug auf die zugewiesenen Ressourcen.** Erstes Diagramm (*ein sog. Histogram in gruppierten 5% Schritten*) bietet einen Überblick wie die prozentuale Auslastung für alle VMs im Verhältnis aussieht, letzteres Diagramm (*ein sog. Scatter Diagramm*) hingegen erlaubt einen Bezug zwischen zugewiesener Ressourcen und tatsächlicher Nutzung auf einzelner VM Ebene.")
 
@@ -160,44 +266,76 @@ with content_section:
         with column_1_2:
             st.markdown("<h4 style='text-align: center; color:#034EA2;'>vCPU Diagramme</h4>", unsafe_allow_html=True)
 
-            histogram_chart_vCPU, histogram_chart_vCPU_config = custom_functions.generate_histogram_charts(custom_df, "vCPUs", performance_type_selected)
+            histogram_chart_vCPU, histogram_chart_vCPU_config = custom_functions.compute_node(computation_graph, computation_inputs, 'histogram_chart_vCPU', custom_functions.get_cached_chart, custom_functions.get_figure_cache_key(main_df, vCluster_selected, powerstate_selected, performance_type_selected, "vCPU", "histogram"), custom_functions.generate_histogram_charts, histogram_cube_selected, "vCPUs", performance_type_selected)
             st.plotly_chart(histogram_chart_vCPU,use_container_width=True, config=histogram_chart_vCPU_config)
 
-            scatter_chart_vCPU, scatter_chart_vCPU_config = custom_functions.generate_scatter_charts(custom_df, "vCPUs", performance_type_selected)
+            scatter_chart_vCPU, scatter_chart_vCPU_config = custom_functions.compute_node(computation_graph, computation_inputs, 'scatter_chart_vCPU', lambda: custom_functions.get_cached_chart(custom_functions.get_figure_cache_key(main_df, vCluster_selected, powerstate_selected, performance_type_selected, "vCPU", "scatter"), custom_functions.generate_scatter_charts, get_custom_df(), "vCPUs", performance_type_selected))
             st.plotly_chart(scatter_chart_vCPU,use_container_width=True, config=scatter_chart_vCPU_config)
 
         with column_2_2:
             st.markdown("<h4 style='text-align: center; color:#034EA2;'>vMemory Diagramme</h4>", unsafe_allow_html=True)
 
-            histogram_chart_vMemory, histogram_chart_vMemory_config = custom_functions.generate_histogram_charts(custom_df, "vMemory Size (GiB)", performance_type_selected)
+            histogram_chart_vMemory, histogram_chart_vMemory_config = custom_functions.compute_node(computation_graph, computation_inputs, 'histogram_chart_vMemory', custom_functions.get_cached_chart, custom_functions.get_figure_cache_key(main_df, vCluster_selected, powerstate_selected, performance_type_selected, "vMemory", "histogram"), custom_functions.generate_histogram_charts, histogram_cube_selected, "vMemory Size (GiB)", performance_type_selected)
             st.plotly_chart(histogram_chart_vMemory,use_container_width=True, config=histogram_chart_vMemory_config)
 
-            scatter_chart_vMemory, scatter_chart_vMemory_config = custom_functions.generate_scatter_charts(custom_df, "vMemory Size (GiB)", performance_type_selected)
+            scatter_chart_vMemory, scatter_chart_vMemory_config = custom_functions.compute_node(computation_graph, computation_inputs, 'scatter_chart_vMemory', lambda: custom_functions.get_cached_chart(custom_functions.get_figure_cache_key(main_df, vCluster_selected, powerstate_selected, performance_type_selected, "vMemory", "scatter"), custom_functions.generate_scatter_charts, get_custom_df(), "vMemory Size (GiB)", performance_type_selected))
             st.plotly_chart(scatter_chart_vMemory,use_container_width=True, config=scatter_chart_vMemory_config)
 
         st.markdown("<h4 style='text-align: center; color:#000000; background-color: #F5F5F5;'>VM Details:</h4><br/>", unsafe_allow_html=True)
-        st.markdown("In der folgenden Tabelle können Sie die vCPU & vMemory Details der einzelnen VMs genauer betrachten. Anhand der Filter können Sie bestimmte Spalten ein und oder ausblenden und so verschiedene umfangreiche Ansichten erhalten. Die Spalten lassen sich auf oder absteigend sortieren und rechts neben der Tabelle erscheint beim darüber fahren ein Vergrößern-Symbol um die Tabelle auf Fullscreen zu vergrößern. Die Daten in der Tabelle untergliedern sich dabei zum einen in die jeweiligen '%' und daraus berechneten Total Werte für vCPU & Memory '#'. Zuletzt lässt sich die Tabelle als Excel Datei speichern.")
+        st.markdown("In der folgenden Tabelle können Sie die vCPU & vMemory Details der einzelnen VMs genauer betrachten. Anhand der Filter können Sie bestimmte Spalten ein und oder ausblenden und so verschiedene umfangreiche Ansichten erhalten. Die Tabelle lässt sich nach VM Namen durchsuchen, nach jeder Spalte auf oder absteigend sortieren und wird seitenweise angezeigt. Rechts neben der Tabelle erscheint beim darüber fahren ein Vergrößern-Symbol um die Tabelle auf Fullscreen zu vergrößern. Die Daten in der Tabelle untergliedern sich dabei zum einen in die jeweiligen '%' und daraus berechneten Total Werte für vCPU & Memory '#'. Zuletzt lässt sich die Tabelle als Excel Datei speichern.")
 
         # Generate a Multiselect Filter for Column selection, by default only recommended columns are shown
-        default_columns = custom_functions.get_default_columns_to_show(performance_type_selected)
+        default_columns = custom_functions.compute_node(computation_graph, computation_inputs, 'default_columns', custom_functions.get_default_columns_to_show, performance_type_selected, main_df.columns)
 
         vm_detail_columns_to_show = st.multiselect(
             'Wählen Sie die Spalten die angezeigt werden sollen:',
-            options=list(custom_df.columns.values),
-            default=list(custom_df.iloc[:, default_columns]) # Column index of deafult columns to display
+            options=list(main_df.columns.values),
+            default=list(main_df.columns[default_columns]) # Column index of deafult columns to display
             )
 
-        # Generate Dataframe to be shown on streamlit website
-        output_to_show = custom_functions.generate_results_df_for_output(custom_df,vm_detail_columns_to_show)
-        
-        st.dataframe(output_to_show)
+        # Search, sort & page on the server - only the visible page is formatted and sent to the browser
+        vm_details_search_column, vm_details_sort_column, vm_details_order_column = st.columns([2, 2, 1])
+        vm_details_search = vm_details_search_column.text_input('VM Name enthält:', help='Filtern Sie die Tabelle nach Teilen des VM Namens (Groß-/Kleinschreibung wird ignoriert).')
+        vm_details_sort_by = vm_details_sort_column.selectbox('Sortieren nach:', ['(keine Sortierung)'] + list(main_df.columns.values))
+        vm_details_descending = vm_details_order_column.checkbox('Absteigend', value=True)
+        vm_details_sort_by = None if vm_details_sort_by == '(keine Sortierung)' else vm_details_sort_by
+
+        computation_inputs['vm_details_view'] = (vm_details_sort_by, vm_details_descending, vm_details_search)
+        vm_details_rows = custom_functions.compute_node(computation_graph, computation_inputs, 'vm_details_rows', custom_functions.get_vm_details_rows, main_df, vCluster_selected, powerstate_selected, vm_details_sort_by, not vm_details_descending, vm_details_search)
+        vm_details_pages = max(1, -(-len(vm_details_rows) // custom_functions.vm_details_page_rows))
+        vm_details_page_number = st.number_input('Seite (von {}):'.format(vm_details_pages), min_value=1, max_value=vm_details_pages, value=1, step=1)
+
+        computation_inputs['visible_columns'] = tuple(vm_detail_columns_to_show)
+        computation_inputs['vm_details_page'] = vm_details_page_number
+        st.dataframe(custom_functions.compute_node(computation_graph, computation_inputs, 'vm_details_page', custom_functions.get_vm_details_page, main_df, vm_details_rows, vm_detail_columns_to_show, vm_details_page_number))
+        st.caption('VMs {} - {} von {}'.format(min(len(vm_details_rows), (vm_details_page_number - 1) * custom_functions.vm_details_page_rows + 1), min(len(vm_details_rows), vm_details_page_number * custom_functions.vm_details_page_rows), len(vm_details_rows)))
 
         with st.form(key='download_form'):
-            submit = st.form_submit_button('Aktuelle Auswertung als Excel herunterladen?')
+            download_format = st.selectbox('Format:', ['xlsx'] + custom_functions.export_formats, help='Excel Bericht mit Übersicht & Anmerkungen oder nur die VM Details als CSV (auch gzip komprimiert) bzw. Parquet Datei für die Weiterverarbeitung.')
+            submit = st.form_submit_button('Aktuelle Auswertung herunterladen?')
 
         if submit:
             with st.spinner('Download wird vorbereitet...'):
-                time.sleep(5)
+                # all rows of the current view (filter, search & sort), not only the visible page
+                output_to_show = custom_functions.generate_results_df_for_output(main_df.iloc[vm_details_rows], vm_detail_columns_to_show)
+                if download_format == 'xlsx':
+                    excel_data = custom_functions.download_as_excel(output_to_show,vCPU_overview,vMemory_overview)
+                else: # streamlit needs the whole file for the download button
+                    excel_data = b''.join(custom_functions.generate_export_chunks(output_to_show, download_format))
             st.success('Done!')
             st.download_button(
-                label='⏬ Download', data=custom_functions.download_as_excel(output_to_show,vCPU_overview,vMemory_overview), file_name='VM_Right_Sizing_Analyse.xlsx')
+                label='⏬ Download', data=excel_data, file_name='VM_Right_Sizing_Analyse.' + download_format)
+
+if custom_functions.diagnostics_enabled:
+    with st.expander(label='Diagnose'):
+        st.markdown("Laufzeit, Speicherbedarf (Peak des gesamten Prozesses, inkl. paralleler Sessions), Zeilenanzahl und Cache Status der einzelnen Verarbeitungsschritte dieses Durchlaufs (Session {}).".format(st.session_state['session_id']))
+        st.dataframe(pd.DataFrame(instrumentation_records))
+        figure_cache_stats = custom_functions.get_figure_cache_stats()
+        st.markdown("Diagramm Cache: {} Treffer, {} neu erzeugt, {} verdrängt, {} Einträge (Trefferquote: {}).".format(figure_cache_stats['hits'], figure_cache_stats['misses'], figure_cache_stats['evictions'], figure_cache_stats['entries'], figure_cache_stats['hit_rate']))
+        if 'computation_graph' in st.session_state:
+            st.markdown("Verarbeitungsschritte dieser Session: wiederverwendet (hits) vs neu berechnet (recomputes) seit dem Start der Session.")
+            st.dataframe(custom_functions.get_computation_graph_stats(st.session_state['computation_graph']))
+        if selected_vms.any():
+            memory_report_df, bytes_per_vm = custom_functions.get_memory_report(main_df)
+            st.markdown("Speicherbedarf der VM Tabelle: **{:.0f} Bytes pro VM** ({:.2f} MiB für {} VMs).".format(bytes_per_vm, memory_report_df['Bytes'].sum() / 1024 / 1024, main_df.shape[0]))
+            st.dataframe(memory_report_df)
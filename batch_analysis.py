@@ -0,0 +1,132 @@
+import argparse
+import glob
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+import custom_functions
+
+######################
+# Headless batch analysis of Nutanix Collector exports (runs without streamlit)
+# Usage: python batch_analysis.py "exports/*.xlsx" --output-dir reports --workers 4
+######################
+
+# Collect all xlsx files from the given directories / glob patterns / file paths, returns the files & the explicitly given paths that do not exist
+def collect_input_files(inputs):
+
+    input_files = []
+    missing_inputs = []
+    for input_path in inputs:
+        if os.path.isdir(input_path):
+            input_files.extend(glob.glob(os.path.join(input_path, "*.xlsx")))
+        elif not glob.has_magic(input_path) and not os.path.exists(input_path):
+            missing_inputs.append(input_path) # a pattern may match nothing, a file path has to exist
+        else:
+            input_files.extend(glob.glob(input_path))
+    input_files = [file for file in input_files if not os.path.basename(file).startswith("~$")] # skip excel lock files
+
+    return sorted(set(os.path.abspath(file) for file in input_files)), missing_inputs
+
+# Analyse a single Collector export and write its excel report - runs inside a worker process
+def process_collector_file(input_file, output_dir, powerstate_selected, performance_type_selected):
+
+    warnings.simplefilter("ignore") # Ignore openpyxl Excile File Warning while reading (no default style)
+    custom_functions.sheet_parse_workers = 1 # files are already spread across worker processes, tabs are parsed one after another
+
+    result = {'File': os.path.basename(input_file), 'Report': None, 'Error': None}
+    timings = {}
+    try:
+        start_time = time.perf_counter()
+        main_df = custom_functions.get_data_from_excel(input_file)
+        timings['Parse (s)'] = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        custom_df = main_df.query("`Power State`==@powerstate_selected") if powerstate_selected else main_df
+        vCPU_overview = custom_functions.generate_vCPU_overview_df(custom_df)
+        vMemory_overview = custom_functions.generate_vMemory_overview_df(custom_df)
+        savings_vCPU, savings_vMemory = custom_functions.get_savings_value(performance_type_selected, vCPU_overview, vMemory_overview.data)
+        timings['Overview (s)'] = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        default_columns = custom_functions.get_default_columns_to_show(performance_type_selected)
+        output_to_show = custom_functions.generate_results_df_for_output(custom_df, list(custom_df.columns[default_columns]))
+        report_file = os.path.join(output_dir, os.path.splitext(os.path.basename(input_file))[0] + "_VM_Right_Sizing_Analyse.xlsx")
+        with open(report_file, "wb") as f:
+            f.write(custom_functions.download_as_excel(output_to_show, vCPU_overview, vMemory_overview))
+        timings['Report (s)'] = time.perf_counter() - start_time
+
+        result.update({
+            'Report': os.path.basename(report_file),
+            'Cluster': custom_df['Cluster Name'].nunique(),
+            'VMs': custom_df.shape[0],
+            'vCPUs Provisioned': int(vCPU_overview.iat[0,1]),
+            'vCPU Savings': savings_vCPU,
+            'vMemory Provisioned (GiB)': round(float(vMemory_overview.data.iat[0,1]), 2),
+            'vMemory Savings (GiB)': savings_vMemory,
+        })
+    except Exception as e: # report failure for this file only, the batch continues
+        result['Error'] = type(e).__name__ + ": " + str(e)
+    result.update({key: round(value, 3) for key, value in timings.items()})
+
+    return result
+
+# Run all files on a process pool and write fleet summary (missing inputs are listed as failed)
+def run_batch(input_files, output_dir, powerstate_selected, performance_type_selected, workers=None, missing_inputs=()):
+
+    os.makedirs(output_dir, exist_ok=True)
+    results = []
+    for missing_input in missing_inputs:
+        result = {'File': os.path.basename(missing_input), 'Report': None, 'Error': "FileNotFoundError: " + missing_input}
+        print(result['File'] + ": FAILED - " + result['Error'], flush=True)
+        results.append(result)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(process_collector_file, input_file, output_dir, powerstate_selected, performance_type_selected): input_file for input_file in input_files}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e: # e.g. worker process crashed
+                result = {'File': os.path.basename(futures[future]), 'Report': None, 'Error': type(e).__name__ + ": " + str(e)}
+            status = "FAILED - " + result['Error'] if result['Error'] else "ok ({} VMs, {:.2f}s parse, {:.2f}s report)".format(result['VMs'], result['Parse (s)'], result['Report (s)'])
+            print(result['File'] + ": " + status, flush=True)
+            results.append(result)
+
+    summary_df = pd.DataFrame(results).sort_values('File')
+    succeeded_df = summary_df[summary_df['Error'].isna()]
+    if not succeeded_df.empty:
+        total_row = succeeded_df.select_dtypes('number').sum().to_dict()
+        total_row.update({'File': 'TOTAL', 'Report': None, 'Error': None})
+        summary_df = pd.concat([summary_df, pd.DataFrame([total_row])], ignore_index=True)
+    summary_df = summary_df.convert_dtypes() # keep counts as integers even if some files failed
+    summary_df.to_csv(os.path.join(output_dir, 'fleet_summary.csv'), index=False)
+
+    return summary_df
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="VM Right Sizing Analyse for many Nutanix Collector exports at once (without streamlit).")
+    parser.add_argument('inputs', nargs='+', help='xlsx files, directories or glob patterns (e.g. "exports/*.xlsx")')
+    parser.add_argument('-o', '--output-dir', default='reports', help='directory for excel reports & fleet_summary.csv (default: reports)')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='number of worker processes (default: number of CPUs)')
+    parser.add_argument('-p', '--performance-type', default='95th Percentile', choices=custom_functions.performance_types, help='performance type for the right sizing (default: 95th Percentile)')
+    parser.add_argument('-s', '--power-state', action='append', default=None, help='power state filter, can be repeated (default: poweredOn, use "all" for no filter)')
+    args = parser.parse_args(argv)
+
+    input_files, missing_inputs = collect_input_files(args.inputs)
+    if not input_files and not missing_inputs:
+        parser.error("no xlsx files found for: " + " ".join(args.inputs))
+    powerstate_selected = args.power_state or ['poweredOn']
+    if 'all' in powerstate_selected:
+        powerstate_selected = None
+
+    start_time = time.perf_counter()
+    summary_df = run_batch(input_files, args.output_dir, powerstate_selected, args.performance_type, args.workers, missing_inputs)
+    failed_files = summary_df['Error'].notna().sum()
+    print("{} files processed in {:.2f}s, {} failed - summary written to {}".format(len(input_files) + len(missing_inputs), time.perf_counter() - start_time, failed_files, os.path.join(args.output_dir, 'fleet_summary.csv')))
+
+    return 1 if failed_files else 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,97 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+benchmarks_directory = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(benchmarks_directory))
+sys.path.insert(0, benchmarks_directory)
+
+import api_service
+from generate_collector_export import generate_collector_export
+
+######################
+# Load test of the local HTTP API: concurrent submissions against a service on localhost, reports throughput & latencies
+# Usage: python benchmarks/api_load_test.py --jobs 40 --concurrency 8 --workers 4 [--file collector.xlsx]
+######################
+
+# Submit one export, poll until it is finished and download result & excel report - returns timings of this job
+def run_client_job(base_url, file_bytes, poll_interval):
+
+    start_time = time.perf_counter()
+    while True:
+        try:
+            request = urllib.request.Request(base_url + "/jobs?performance_type=95th%20Percentile", data=file_bytes, method='POST', headers={'Content-Type': 'application/octet-stream'})
+            with urllib.request.urlopen(request) as response:
+                job_id = json.load(response)['job_id']
+            break
+        except urllib.error.HTTPError as e:
+            if e.code != 503:
+                raise
+            time.sleep(float(e.headers.get('Retry-After', 1)) / 5) # queue full - back off and retry
+    submitted_time = time.perf_counter()
+
+    while True:
+        with urllib.request.urlopen(base_url + "/jobs/" + job_id) as response:
+            job_status = json.load(response)
+        if job_status['status'] in ('done', 'failed'):
+            break
+        time.sleep(poll_interval)
+    if job_status['status'] == 'failed':
+        raise RuntimeError(job_status['error'])
+
+    with urllib.request.urlopen(base_url + "/jobs/" + job_id + "/result") as response:
+        result = json.load(response)
+    with urllib.request.urlopen(base_url + "/jobs/" + job_id + "/report.xlsx") as response:
+        excel_report = response.read()
+
+    return {'submit': submitted_time - start_time, 'total': time.perf_counter() - start_time, 'vms': result['summary']['vms'], 'savings': result['summary']['savings'], 'report_bytes': len(excel_report)}
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Concurrent submissions against the local VM Right Sizing API.")
+    parser.add_argument('--file', default=None, help='Collector export to submit (default: synthetic export with --vms VMs)')
+    parser.add_argument('--vms', type=int, default=2000)
+    parser.add_argument('--jobs', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent clients')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes of the service (default: number of CPUs)')
+    parser.add_argument('--max-queued-jobs', type=int, default=4)
+    parser.add_argument('--poll-interval', type=float, default=0.05)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as temp_directory:
+        export_file = args.file
+        if export_file is None:
+            export_file = os.path.join(temp_directory, "collector.xlsx")
+            generate_collector_export(export_file, args.vms)
+        with open(export_file, 'rb') as f:
+            file_bytes = f.read()
+
+        os.environ["VM_RIGHT_SIZING_CACHE_DIR"] = os.path.join(temp_directory, "cache") # inherited by the worker processes
+        server = api_service.create_server(port=0, workers=args.workers, max_queued_jobs=args.max_queued_jobs, quiet=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = "http://{}:{}".format(*server.server_address)
+        try:
+            start_time = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+                job_results = list(executor.map(lambda _: run_client_job(base_url, file_bytes, args.poll_interval), range(args.jobs)))
+            duration = time.perf_counter() - start_time
+            with urllib.request.urlopen(base_url + "/health") as response:
+                health = json.load(response)
+        finally:
+            api_service.shutdown_server(server)
+
+    latencies = sorted(job_result['total'] for job_result in job_results)
+    print("{} jobs ({} VMs each) with {} concurrent clients on {} workers: {:.2f}s, {:.2f} jobs/s".format(args.jobs, job_results[0]['vms'], args.concurrency, health['workers'], duration, args.jobs / duration))
+    print("latency p50 {:.2f}s, p95 {:.2f}s, max {:.2f}s - rejected submissions (queue full, retried): {}".format(latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.95) - 1 if len(latencies) > 1 else 0], latencies[-1], health['counters']['rejected']))
+    if len(set(json.dumps(job_result['savings']) for job_result in job_results)) != 1:
+        raise SystemExit("results differ between jobs")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from datetime import datetime
+
+benchmarks_directory = os.path.dirname(os.path.abspath(__file__))
+repository_directory = os.path.dirname(benchmarks_directory)
+sys.path.insert(0, repository_directory)
+sys.path.insert(0, benchmarks_directory)
+
+from generate_collector_export import generate_collector_export
+
+######################
+# End-to-end benchmark: time & peak memory of every processing stage for synthetic Collector exports
+# Usage: python benchmarks/benchmark_suite.py --sizes 1000 10000 100000 500000
+# Results are written as json to benchmarks/results/ and can be compared across commits.
+######################
+
+performance_type_selected = '95th Percentile'
+
+# Parse export with an empty registry of shared datasets - the Arrow IPC cache file is opened (memory-mapped) again on every call
+def get_data_from_disk_cache(custom_functions, export_file):
+
+    with custom_functions.shared_datasets_lock:
+        custom_functions.shared_datasets.clear()
+
+    return custom_functions.get_data_from_excel(export_file)
+
+# Run func, measure wall time in a plain run and peak python memory (tracemalloc) in a second run
+def measure_stage(results, stage_name, func, measure_memory=True):
+
+    start_time = time.perf_counter()
+    return_value = func()
+    duration = time.perf_counter() - start_time
+
+    peak_mib = None
+    if measure_memory:
+        del return_value
+        tracemalloc.start()
+        return_value = func()
+        peak_mib = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 2)
+        tracemalloc.stop()
+
+    results[stage_name] = {'seconds': round(duration, 4), 'peak_mib': peak_mib}
+    print("  {:<36}{:>10.3f}s{:>12}".format(stage_name, duration, str(peak_mib) + " MiB" if peak_mib is not None else "-"), flush=True)
+
+    return return_value
+
+# Run all stages for a single export (same sequence as app.py)
+def benchmark_export(export_file, cache_directory):
+
+    import custom_functions
+    custom_functions.cache_directory = cache_directory
+    results = {}
+
+    # Cold parse runs only once - the second run would be served from the on-disk cache
+    main_df = measure_stage(results, 'get_data_from_excel (cold)', lambda: custom_functions.get_data_from_excel(export_file), measure_memory=False)
+    main_df = measure_stage(results, 'get_data_from_excel (disk cache)', lambda: get_data_from_disk_cache(custom_functions, export_file))
+
+    vCluster_selected = sorted(main_df["Cluster Name"].unique())
+    powerstate_selected = ["poweredOn"]
+    custom_df = measure_stage(results, 'filter', lambda: custom_functions.filter_main_df(main_df, vCluster_selected, powerstate_selected))
+    aggregation_cube_df, histogram_cube_df = measure_stage(results, 'generate_aggregation_cube', lambda: custom_functions.generate_aggregation_cube(main_df))
+    aggregation_cube_selected = custom_functions.filter_aggregation_cube(aggregation_cube_df, vCluster_selected, powerstate_selected)
+    histogram_cube_selected = custom_functions.filter_aggregation_cube(histogram_cube_df, vCluster_selected, powerstate_selected)
+
+    vCPU_overview, vMemory_overview = measure_stage(results, 'overview generators', lambda: (
+        custom_functions.generate_vCPU_overview_df(aggregation_cube_selected), custom_functions.generate_vMemory_overview_df(aggregation_cube_selected)))
+    measure_stage(results, 'get_savings_value', lambda: custom_functions.get_savings_value(performance_type_selected, vCPU_overview, vMemory_overview.data))
+    measure_stage(results, 'generate_histogram_charts', lambda: [
+        custom_functions.generate_histogram_charts(histogram_cube_selected, y_axis_name, performance_type_selected)[0].to_json() for y_axis_name in ["vCPUs", "vMemory Size (GiB)"]])
+    measure_stage(results, 'generate_scatter_charts', lambda: [
+        custom_functions.generate_scatter_charts(custom_df, y_axis_name, performance_type_selected)[0].to_json() for y_axis_name in ["vCPUs", "vMemory Size (GiB)"]])
+
+    default_columns = custom_functions.get_default_columns_to_show(performance_type_selected)
+    vm_detail_columns_to_show = list(custom_df.columns[default_columns])
+    output_to_show = measure_stage(results, 'generate_results_df_for_output', lambda: custom_functions.generate_results_df_for_output(custom_df, vm_detail_columns_to_show))
+    measure_stage(results, 'download_as_excel', lambda: custom_functions.download_as_excel(output_to_show, vCPU_overview, vMemory_overview))
+
+    return {'vms': int(main_df.shape[0]), 'vms_filtered': int(custom_df.shape[0]), 'bytes_per_vm': round(custom_functions.get_memory_report(main_df)[1], 1), 'stages': results}
+
+# Get commit of the benchmarked tree, so results can be compared across commits
+def get_git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=repository_directory, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Time & memory profile every stage of the VM right sizing analysis on synthetic Collector exports.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='number of VMs per synthetic export (default: 1000 10000 100000, e.g. add 500000)')
+    parser.add_argument('--data-dir', default=os.path.join(benchmarks_directory, 'data'), help='directory for the generated exports (reused across runs)')
+    parser.add_argument('--output', default=None, help='json result file (default: benchmarks/results/<timestamp>_<commit>.json)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    warnings.simplefilter("ignore") # Ignore openpyxl Excile File Warning while reading (no default style)
+    os.makedirs(args.data_dir, exist_ok=True)
+    git_commit = get_git_commit()
+    benchmark_results = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': [],
+    }
+
+    for vm_count in args.sizes:
+        export_file = os.path.join(args.data_dir, "collector_{}_seed{}.xlsx".format(vm_count, args.seed))
+        if not os.path.exists(export_file):
+            print("generating {} ...".format(export_file), flush=True)
+            generate_collector_export(export_file, vm_count, seed=args.seed)
+        print("{} VMs ({:.1f} MiB xlsx):".format(vm_count, os.path.getsize(export_file) / 1024 / 1024), flush=True)
+        with tempfile.TemporaryDirectory() as cache_directory: # always start with an empty on-disk cache
+            size_results = benchmark_export(export_file, cache_directory)
+        size_results['xlsx_mib'] = round(os.path.getsize(export_file) / 1024 / 1024, 2)
+        benchmark_results['results'].append(size_results)
+
+    output_file = args.output or os.path.join(benchmarks_directory, 'results', "{}_{}.json".format(datetime.now().strftime("%Y%m%d-%H%M%S"), git_commit or 'unknown'))
+    os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+    with open(output_file, 'w') as f:
+        json.dump(benchmark_results, f, indent=2)
+    print("results written to " + output_file)
+
+if __name__ == '__main__':
+    main()
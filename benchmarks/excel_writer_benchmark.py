@@ -0,0 +1,103 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+######################
+# Benchmark of the VM Details excel export: former pandas.ExcelWriter path ("before") vs download_as_excel ("after")
+# Usage: python benchmarks/excel_writer_benchmark.py --rows 10000 100000
+######################
+
+# Generate a synthetic right sizing dataframe with the same columns & datatypes as get_data_from_excel
+def generate_vm_details_df(rows, seed=0):
+
+    rng = np.random.default_rng(seed)
+    vm_details_df = pd.DataFrame({
+        'VM Name': ['VM ' + str(i) for i in range(rows)],
+        'Power State': rng.choice(['poweredOn', 'poweredOff'], rows),
+        'Cluster Name': rng.choice(['Cluster ' + str(i) for i in range(8)], rows),
+        'vCPUs': rng.choice([1, 2, 4, 8, 16], rows).astype(np.int16),
+    })
+    for performance_type in ['Peak', 'Average', 'Median', '95th Percentile']:
+        vm_details_df['vCPU ' + performance_type + ' %'] = (rng.random(rows) * 100).astype(np.float32)
+        vm_details_df['vCPU ' + performance_type + ' #'] = rng.integers(1, 16, rows).astype(np.int16)
+    vm_details_df['vMemory Size (GiB)'] = rng.choice([1, 2, 4, 8, 16, 64], rows).astype(np.float32)
+    for performance_type in ['Peak', 'Average', 'Median', '95th Percentile']:
+        vm_details_df['vMemory ' + performance_type + ' %'] = (rng.random(rows) * 100).astype(np.float32)
+        vm_details_df['vMemory ' + performance_type + ' #'] = rng.integers(1, 64, rows).astype(np.float32)
+
+    return vm_details_df
+
+# Former implementation of the VM Details sheet: pandas.ExcelWriter with default xlsxwriter settings & per cell float_format
+def legacy_write_vm_details(vm_details_df):
+
+    from io import BytesIO
+    output = BytesIO()
+    writer = pd.ExcelWriter(output, engine='xlsxwriter')
+    vm_details_df.style.format(precision=2, na_rep='nicht vorhanden').to_excel(writer, index=False, sheet_name='VM Details', startrow=4, startcol=0, float_format='%.2f')
+    worksheet_vm_details = writer.sheets['VM Details']
+    for col in range(21): #set column width for cells
+        worksheet_vm_details.set_column(col, col, 25)
+    worksheet_vm_details.add_table(4, 0, len(vm_details_df) + 4, len(vm_details_df.columns) - 1, {'columns': [{'header': c} for c in vm_details_df.columns]})
+    writer.close()
+
+    return output.getvalue()
+
+# Run one writer in the current process and return rows/s & peak RSS
+def run_single(writer_name, rows):
+
+    warnings.simplefilter("ignore")
+    import custom_functions
+
+    vm_details_df = generate_vm_details_df(rows)
+    vCPU_overview = custom_functions.generate_vCPU_overview_df(vm_details_df)
+    vMemory_overview = custom_functions.generate_vMemory_overview_df(vm_details_df)
+    rss_before_mib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    start_time = time.perf_counter()
+    if writer_name == 'before':
+        processed_data = legacy_write_vm_details(vm_details_df)
+    else:
+        processed_data = custom_functions.download_as_excel(vm_details_df, vCPU_overview, vMemory_overview)
+    duration = time.perf_counter() - start_time
+
+    return {
+        'writer': writer_name,
+        'rows': rows,
+        'seconds': round(duration, 3),
+        'rows_per_second': round(rows / duration),
+        'peak_rss_mib': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'peak_rss_increase_mib': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 - rss_before_mib, 1),
+        'output_mib': round(len(processed_data) / 1024 / 1024, 2),
+    }
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Benchmark excel export before / after (rows per second & peak RSS).")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--single', choices=['before', 'after'], help=argparse.SUPPRESS) # internal: run one measurement
+    args = parser.parse_args(argv)
+
+    if args.single:
+        print(json.dumps(run_single(args.single, args.rows[0])))
+        return
+
+    # every measurement runs in a fresh process, as peak RSS can only grow within a process
+    print("{:<8}{:>10}{:>10}{:>14}{:>18}{:>12}".format('writer', 'rows', 'seconds', 'rows/s', 'peak RSS +MiB', 'xlsx MiB'))
+    for rows in args.rows:
+        for writer_name in ['before', 'after']:
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), '--single', writer_name, '--rows', str(rows)], capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print("{:<8}{:>10}{:>10}{:>14}{:>18}{:>12}".format(result['writer'], result['rows'], result['seconds'], result['rows_per_second'], result['peak_rss_increase_mib'], result['output_mib']))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+import argparse
+
+import numpy as np
+import xlsxwriter
+
+######################
+# Generate synthetic Nutanix Collector exports (vInfo / vCPU / vMemory tabs) for benchmarks
+# Usage: python benchmarks/generate_collector_export.py 10000 collector_10k.xlsx
+######################
+
+performance_columns = ["Peak %", "Average %", "Median %", "95th Percentile % (recommended)"]
+
+# Generate realistic utilization percentages: 95th percentile as base, peak above, median & average below
+def generate_performance_values(rng, vm_count, powered_off, missing_ratio_powered_on, missing_ratio_powered_off):
+
+    percentile_95 = rng.beta(1.6, 4.5, vm_count) * 100
+    values = {
+        "95th Percentile % (recommended)": percentile_95,
+        "Peak %": np.minimum(percentile_95 * rng.uniform(1.0, 2.5, vm_count), 100),
+        "Median %": percentile_95 * rng.uniform(0.2, 0.9, vm_count),
+        "Average %": percentile_95 * rng.uniform(0.25, 0.95, vm_count),
+    }
+    # powered off VMs usually have no performance data, powered on VMs only rarely
+    missing = np.where(powered_off, rng.random(vm_count) < missing_ratio_powered_off, rng.random(vm_count) < missing_ratio_powered_on)
+    for column in values:
+        values[column] = np.where(missing, np.nan, np.round(values[column], 2))
+
+    return values
+
+# Write a Collector like workbook with vm_count VMs
+def generate_collector_export(path, vm_count, seed=0, cluster_count=None, powered_off_ratio=0.15, missing_ratio_powered_on=0.01, missing_ratio_powered_off=0.9):
+
+    rng = np.random.default_rng(seed)
+    cluster_count = cluster_count or max(1, min(64, vm_count // 250))
+    cluster_names = np.array(["Cluster-" + str(i).zfill(2) for i in range(cluster_count)])
+
+    vm_names = np.array(["vm-" + str(i).zfill(7) for i in range(vm_count)])
+    moids = np.array(["vm-" + str(1000 + i) for i in range(vm_count)])
+    powered_off = rng.random(vm_count) < powered_off_ratio
+    power_states = np.where(powered_off, "poweredOff", "poweredOn")
+    clusters = cluster_names[rng.zipf(1.6, vm_count) % cluster_count] # a few large and many small clusters
+    hosts = np.char.add(np.char.add(clusters, "-host-"), rng.integers(1, 17, vm_count).astype(str))
+    operating_systems = rng.choice(["Microsoft Windows Server 2019 (64-bit)", "Microsoft Windows Server 2022 (64-bit)", "Red Hat Enterprise Linux 8 (64-bit)", "Ubuntu Linux (64-bit)"], vm_count)
+    vCPUs = rng.choice([1, 2, 4, 6, 8, 12, 16, 24, 32], vm_count, p=[0.08, 0.3, 0.3, 0.05, 0.14, 0.04, 0.05, 0.02, 0.02])
+    memory_mib = rng.choice([512, 1024, 2048, 4096, 8192, 12288, 16384, 32768, 65536, 131072], vm_count, p=[0.02, 0.05, 0.12, 0.25, 0.25, 0.06, 0.12, 0.08, 0.04, 0.01])
+    vCPU_values = generate_performance_values(rng, vm_count, powered_off, missing_ratio_powered_on, missing_ratio_powered_off)
+    vMemory_values = generate_performance_values(rng, vm_count, powered_off, missing_ratio_powered_on, missing_ratio_powered_off)
+
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'nan_inf_to_errors': True})
+    write_sheet(workbook, "vInfo", {
+        "VM Name": vm_names, "Power State": power_states, "Template": np.full(vm_count, "False"), "Cluster Name": clusters,
+        "Host": hosts, "OS according to the configuration file": operating_systems, "MOID": moids,
+    }, np.arange(vm_count))
+    # the vCPU & vMemory tabs are not in the same order as vInfo - the merge has to rely on the MOID
+    write_sheet(workbook, "vCPU", dict({"VM Name": vm_names, "Power State": power_states, "vCPUs": vCPUs}, **vCPU_values, **{"Cluster Name": clusters, "MOID": moids}), rng.permutation(vm_count))
+    write_sheet(workbook, "vMemory", dict({"VM Name": vm_names, "Power State": power_states, "Size (MiB)": memory_mib}, **vMemory_values, **{"Cluster Name": clusters, "MOID": moids}), rng.permutation(vm_count))
+    write_sheet(workbook, "vDisk", { # unused tab, only there to make the workbook realistically large
+        "VM Name": vm_names, "Disk": np.full(vm_count, "Hard disk 1"), "Capacity (MiB)": rng.choice([40960, 102400, 512000], vm_count), "MOID": moids,
+    }, np.arange(vm_count))
+    workbook.close()
+
+# Write all columns row by row (constant_memory mode requires ascending rows)
+def write_sheet(workbook, sheet_name, columns, row_order):
+
+    worksheet = workbook.add_worksheet(sheet_name)
+    worksheet.write_row(0, 0, list(columns))
+    column_values = [values[row_order].tolist() for values in columns.values()]
+    for row, row_values in enumerate(zip(*column_values), start=1):
+        for col, value in enumerate(row_values):
+            if isinstance(value, float) and np.isnan(value):
+                continue # empty cell like in Collector exports
+            worksheet.write(row, col, value)
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Generate a synthetic Nutanix Collector export.")
+    parser.add_argument('vm_count', type=int)
+    parser.add_argument('path')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    generate_collector_export(args.path, args.vm_count, args.seed)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+benchmarks_directory = os.path.dirname(os.path.abspath(__file__))
+repository_directory = os.path.dirname(benchmarks_directory)
+
+######################
+# Cold start check: import time of the app modules in fresh interpreters, compared to the import of pandas / numpy / pyarrow
+# alone (which every module needs anyway). Fails (exit code 1) if the overhead exceeds the budget or if a lazily loaded
+# subsystem (plotly, openpyxl, xlsxwriter, ...) is imported at startup.
+# Usage: python benchmarks/import_time_check.py --runs 5 --budget-ms 250
+######################
+
+baseline_modules = ['pandas', 'numpy', 'pyarrow']
+checked_modules = ['custom_functions', 'percentile_sketches', 'consolidation_planner', 'export_diff'] # imported by app.py
+# only imported on first use (charts, parsing, excel download) or not at all (commented out AWS / Slack code)
+lazy_modules = ['plotly', 'openpyxl', 'xlsxwriter', 'PIL', 'botocore', 'boto3', 'requests', 'streamlit']
+
+# Import modules in a fresh interpreter, returns seconds & names of all loaded top level modules
+def measure_import(modules):
+
+    code = "import json, sys, time\nstart_time = time.perf_counter()\nimport {}\nprint(json.dumps([time.perf_counter() - start_time, sorted({{name.split('.')[0] for name in sys.modules}})]))".format(", ".join(modules))
+    output = subprocess.run([sys.executable, '-c', code], cwd=repository_directory, capture_output=True, text=True, check=True).stdout
+    seconds, loaded_modules = json.loads(output.strip().splitlines()[-1])
+
+    return seconds, loaded_modules
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Import time budget of the VM Right Sizing modules.")
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters per measurement (median is used)')
+    parser.add_argument('--budget-ms', type=float, default=float(os.environ.get("VM_RIGHT_SIZING_IMPORT_BUDGET_MS", "250")), help='allowed import time on top of pandas / numpy / pyarrow')
+    args = parser.parse_args(argv)
+
+    baseline_seconds = statistics.median(measure_import(baseline_modules)[0] for _ in range(args.runs))
+    module_measurements = [measure_import(checked_modules) for _ in range(args.runs)]
+    module_seconds = statistics.median(seconds for seconds, _ in module_measurements)
+    overhead_ms = (module_seconds - baseline_seconds) * 1000
+    eagerly_loaded = [module for module in lazy_modules if module in module_measurements[0][1]]
+
+    print("pandas / numpy / pyarrow: {:.0f} ms, app modules: {:.0f} ms, overhead: {:.0f} ms (budget: {:.0f} ms)".format(baseline_seconds * 1000, module_seconds * 1000, overhead_ms, args.budget_ms))
+    if eagerly_loaded:
+        print("FAILED: imported at startup: " + ", ".join(eagerly_loaded))
+    if overhead_ms > args.budget_ms:
+        print("FAILED: import time over budget")
+
+    return 1 if eagerly_loaded or overhead_ms > args.budget_ms else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
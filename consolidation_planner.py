@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+
+######################
+# Node consolidation planner: how many nodes of a given profile do the VMs of each cluster need - provisioned vs right sized.
+# VMs are packed with first-fit-decreasing (vCPU & memory at the same time). VMs of identical size are packed as one group:
+# first-fit puts identical VMs into the open nodes in order until each is full, so the whole group is placed with a few
+# vectorized operations over the open nodes instead of one loop iteration per VM.
+######################
+
+# default node profile (cores & RAM per node, vCPU : pCore overcommit ratio, spare nodes per cluster for N+1)
+default_node_cores = 64
+default_node_memory_gib = 1024
+default_cpu_overcommit = 4.0
+default_reserve_nodes = 1
+
+# Pack VMs (vCPUs & GiB per VM) onto nodes of the given capacity, returns number of nodes & number of VMs too large for a node
+def pack_first_fit_decreasing(vCPU_values, vMemory_values, node_vCPUs, node_memory_gib):
+
+    vm_sizes = np.column_stack([np.nan_to_num(np.asarray(vCPU_values, dtype=np.float64)), np.nan_to_num(np.asarray(vMemory_values, dtype=np.float64))])
+    vm_sizes = vm_sizes[(vm_sizes > 0).any(axis=1)] # VMs without any resources (e.g. missing in the vCPU & vMemory tab) need no space
+    sizes, size_counts = np.unique(vm_sizes, axis=0, return_counts=True)
+
+    fits_node = (sizes[:, 0] <= node_vCPUs) & (sizes[:, 1] <= node_memory_gib)
+    oversized_vms = int(size_counts[~fits_node].sum())
+    sizes, size_counts = sizes[fits_node], size_counts[fits_node]
+
+    # decreasing by the dominant resource (share of a node), ties by the other resource
+    node_shares = sizes / np.array([node_vCPUs, node_memory_gib])
+    order = np.lexsort((sizes[:, 1], sizes[:, 0], node_shares.min(axis=1), node_shares.max(axis=1)))[::-1]
+
+    vCPUs_left = np.empty(0)
+    memory_left = np.empty(0)
+    for (vCPUs, memory_gib), vm_count in zip(sizes[order], size_counts[order]):
+        # number of VMs of this size every open node can still take (a tiny tolerance absorbs float rounding of the GiB values)
+        vms_per_node = np.minimum(np.floor((vCPUs_left + 1e-9) / vCPUs) if vCPUs > 0 else np.inf, np.floor((memory_left + 1e-9) / memory_gib) if memory_gib > 0 else np.inf)
+        vms_before_node = np.cumsum(vms_per_node) - vms_per_node
+        placed_vms = np.clip(vm_count - vms_before_node, 0, vms_per_node) # first-fit: earlier nodes are filled up first
+        vCPUs_left -= placed_vms * vCPUs
+        memory_left -= placed_vms * memory_gib
+
+        # open new nodes for the rest, all full except the last one
+        remaining_vms = int(vm_count - placed_vms.sum())
+        if remaining_vms > 0:
+            vms_per_new_node = int(min(np.floor(node_vCPUs / vCPUs) if vCPUs > 0 else np.inf, np.floor(node_memory_gib / memory_gib + 1e-9) if memory_gib > 0 else np.inf, remaining_vms))
+            new_node_vms = np.full(-(-remaining_vms // vms_per_new_node), vms_per_new_node)
+            new_node_vms[-1] = remaining_vms - vms_per_new_node * (len(new_node_vms) - 1)
+            vCPUs_left = np.concatenate([vCPUs_left, node_vCPUs - new_node_vms * vCPUs])
+            memory_left = np.concatenate([memory_left, node_memory_gib - new_node_vms * memory_gib])
+
+    return len(vCPUs_left), oversized_vms
+
+# Plan nodes per cluster for provisioned & right sized resources (based on the '#' columns of the selected performance type)
+def plan_node_consolidation(custom_df, performance_type_selected, node_cores=default_node_cores, node_memory_gib=default_node_memory_gib, cpu_overcommit=default_cpu_overcommit, reserve_nodes=default_reserve_nodes):
+
+    node_vCPUs = node_cores * cpu_overcommit
+    sizing_columns = {
+        'Provisioned': ('vCPUs', 'vMemory Size (GiB)'),
+        'Right-Sized': ('vCPU ' + performance_type_selected + ' #', 'vMemory ' + performance_type_selected + ' #'),
+    }
+
+    plan_rows = []
+    for cluster_name, cluster_df in custom_df.groupby('Cluster Name', observed=True, sort=True):
+        plan_row = {'Cluster Name': cluster_name, 'VMs': int(cluster_df.shape[0])}
+        for sizing, (vCPU_column, vMemory_column) in sizing_columns.items():
+            vCPU_values = cluster_df[vCPU_column].to_numpy(dtype=np.float64, na_value=np.nan)
+            vMemory_values = cluster_df[vMemory_column].to_numpy(dtype=np.float64, na_value=np.nan)
+            packed_nodes, oversized_vms = pack_first_fit_decreasing(vCPU_values, vMemory_values, node_vCPUs, node_memory_gib)
+            plan_row['vCPUs ' + sizing] = int(np.nansum(vCPU_values))
+            plan_row['GiB ' + sizing] = round(float(np.nansum(vMemory_values)), 2)
+            plan_row['Nodes ' + sizing] = packed_nodes + (reserve_nodes if packed_nodes > 0 else 0)
+            plan_row['VMs too large ' + sizing] = oversized_vms
+        plan_rows.append(plan_row)
+
+    plan_df = pd.DataFrame(plan_rows, columns=['Cluster Name', 'VMs'] + [prefix + ' ' + sizing for sizing in sizing_columns for prefix in ['vCPUs', 'GiB', 'Nodes', 'VMs too large']])
+    plan_df['Nodes Saved'] = plan_df['Nodes Provisioned'] - plan_df['Nodes Right-Sized']
+
+    return plan_df
@@ -1,21 +1,194 @@
 import pandas as pd
 import numpy as np
-import streamlit as st
-import plotly.express as px  # pip install plotly-express
-import plotly.io as pio
+import sys
 from io import BytesIO
 from datetime import datetime
-from botocore.exceptions import ClientError
-# import boto3
-from PIL import Image
-import requests
+from collections import OrderedDict
+import hashlib
+import zlib
+import base64
+import os
+import time
+import functools
+import logging
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, CancelledError, wait
+from concurrent.futures.process import BrokenProcessPool
+import tempfile
+import multiprocessing
+import pyarrow as pa
+import pyarrow.ipc
 import json
+try:
+    import resource # process peak memory for the diagnostics (not available on Windows)
+except ImportError:
+    resource = None
+# plotly (charts), openpyxl (parsing) & xlsxwriter (excel download) are imported on first use - keeps the cold start fast
 
 ######################
 # Initialize variables
 ######################
 # background nutanix logo for diagrams
-background_image = dict(source=Image.open("images/nutanix-x.png"), xref="paper", yref="paper", x=0.5, y=0.5, sizex=0.95, sizey=0.95, xanchor="center", yanchor="middle", opacity=0.04, layer="below", sizing="contain")
+# (encoded once as data uri - plotly would otherwise re-encode a PIL image for every figure)
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "images", "nutanix-x.png"), 'rb') as f:
+    background_image = dict(source="data:image/png;base64," + base64.b64encode(f.read()).decode('ascii'), xref="paper", yref="paper", x=0.5, y=0.5, sizex=0.95, sizey=0.95, xanchor="center", yanchor="middle", opacity=0.04, layer="below", sizing="contain")
+# on-disk cache for parsed Collector exports (keyed by content hash, least recently used files are evicted above max size)
+cache_directory = os.environ.get("VM_RIGHT_SIZING_CACHE_DIR", ".cache/collector_exports")
+cache_max_size_bytes = int(os.environ.get("VM_RIGHT_SIZING_CACHE_MAX_MB", "1024")) * 1024 * 1024
+cache_format_version = 3 # increase whenever the structure of main_df changes, older cache files are ignored & evicted over time
+# memory-mapped datasets of the cache files, shared by all sessions of this process (keyed by content hash)
+shared_datasets = OrderedDict()
+shared_datasets_max_entries = int(os.environ.get("VM_RIGHT_SIZING_SHARED_DATASETS", "8"))
+shared_datasets_lock = threading.Lock()
+# the vInfo / vCPU / vMemory tabs of exports from this size on are parsed concurrently in worker processes (one per tab)
+sheet_parse_workers = int(os.environ.get("VM_RIGHT_SIZING_PARSE_WORKERS", str(min(3, os.cpu_count() or 1))))
+sheet_parse_concurrent_min_bytes = int(os.environ.get("VM_RIGHT_SIZING_PARSE_CONCURRENT_MB", "2")) * 1024 * 1024
+sheet_parse_progress_rows = 5000 # parse progress is reported (and cancellation checked) every n rows per tab
+sheet_parse_executor = None # worker processes are started on first use and kept for later uploads
+parse_progress_manager = None
+sheet_parse_lock = threading.Lock() # sessions start the worker processes at most once
+sheet_parse_context = multiprocessing.get_context('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn') # never fork the multithreaded streamlit server
+sheet_parse_logger = logging.getLogger("vm_right_sizing.parse")
+# uploads are parsed outside of the streamlit script thread - uploads of further sessions wait in the queue (shown as queued in the app)
+background_parse_threads = int(os.environ.get("VM_RIGHT_SIZING_BACKGROUND_PARSES", str(max(2, sheet_parse_workers))))
+background_parse_executor = ThreadPoolExecutor(max_workers=background_parse_threads, thread_name_prefix="collector-parse")
+# headroom on top of the measured utilization for the right sized values (20%) & buffer factors of the what-if sweep (1.0 - 1.5)
+default_buffer_factor = 1.2
+what_if_buffer_factors = np.round(np.arange(1.0, 1.5 + 0.025, 0.05), 2)
+# VM Details with at least this many rows are written to excel in constant_memory mode
+excel_constant_memory_min_rows = int(os.environ.get("VM_RIGHT_SIZING_EXCEL_CONSTANT_MEMORY_ROWS", "20000"))
+# csv / parquet exports of the VM Details are generated in chunks of this many rows (one parquet row group per chunk)
+export_chunk_rows = int(os.environ.get("VM_RIGHT_SIZING_EXPORT_CHUNK_ROWS", "50000"))
+export_formats = ['csv', 'csv.gz', 'parquet']
+# pre-aggregated cluster x power state cubes of the most recently used datasets (keyed by content hash)
+aggregation_cubes = OrderedDict()
+aggregation_cubes_max_entries = 16
+aggregation_cubes_lock = threading.Lock()
+# content hashes of the uploads of a session (keyed by streamlit file_id, kept in the session state)
+upload_hashes_max_entries = 8
+# VM Details table: rows per page, sort orders per dataset & column, row orders per filter / sort / search (page flips only slice)
+vm_details_page_rows = 100
+vm_details_sort_orders = OrderedDict()
+vm_details_sort_orders_max_entries = 64
+vm_details_row_orders = OrderedDict()
+vm_details_row_orders_max_entries = 32
+vm_details_lock = threading.Lock()
+# rendered chart figures (serialized json) keyed by dataset hash, filters, performance type & resource - shared by all sessions
+figure_cache = OrderedDict()
+figure_cache_max_entries = int(os.environ.get("VM_RIGHT_SIZING_FIGURE_CACHE_ENTRIES", "256"))
+figure_cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+figure_cache_lock = threading.Lock()
+# stages of an app rerun: node -> (inputs, upstream nodes) - a node is only recomputed if one of its inputs or upstream nodes changed
+# inputs: dataset (content hash), filters (clusters & power states), performance_type, visible_columns, vm_details_view (sort & search),
+# vm_details_page, node_profile (consolidation settings)
+app_computation_nodes = {
+    'selected_vms': (['dataset', 'filters'], []),
+    'vm_summary': ([], ['selected_vms']),
+    'aggregation_cube_selected': (['dataset', 'filters'], []),
+    'vCPU_overview': ([], ['aggregation_cube_selected']),
+    'vMemory_overview': ([], ['aggregation_cube_selected']),
+    'savings': (['performance_type'], ['vCPU_overview', 'vMemory_overview']),
+    'bar_chart_vCPU': ([], ['vCPU_overview']),
+    'bar_chart_vMemory': ([], ['vMemory_overview']),
+    'what_if_df': ([], ['selected_vms']),
+    'what_if_chart_vCPU': ([], ['what_if_df']),
+    'what_if_chart_vMemory': ([], ['what_if_df']),
+    'consolidation_plan': (['performance_type', 'node_profile'], ['selected_vms']),
+    'histogram_chart_vCPU': (['performance_type'], ['aggregation_cube_selected']),
+    'histogram_chart_vMemory': (['performance_type'], ['aggregation_cube_selected']),
+    'scatter_chart_vCPU': (['performance_type'], ['selected_vms']),
+    'scatter_chart_vMemory': (['performance_type'], ['selected_vms']),
+    'default_columns': (['dataset', 'performance_type'], []),
+    'vm_details_rows': (['dataset', 'filters', 'vm_details_view'], []),
+    'vm_details_page': (['visible_columns', 'vm_details_page'], ['vm_details_rows']),
+}
+# scatter charts with more VMs than this are downsampled (VMs in sparse density cells / outliers are always kept)
+scatter_max_points = int(os.environ.get("VM_RIGHT_SIZING_SCATTER_MAX_POINTS", "5000"))
+scatter_outlier_cell_size = 3
+# performance types precomputed by Collector - further types (e.g. custom percentiles "P90") are detected from the '#' columns
+performance_types = ['Peak', 'Average', 'Median', '95th Percentile']
+# bar colors for provisioned & performance types (last color is used for all additional performance types)
+bar_chart_colors = ['#F36D21', '#4C4C4E', '#6560AB', '#3ABFEF', '#034EA2', '#B0D235']
+# per stage diagnostics (wall time, process peak memory, row counts, cache hit/miss) - off by default, enable with VM_RIGHT_SIZING_DIAGNOSTICS=1
+diagnostics_enabled = os.environ.get("VM_RIGHT_SIZING_DIAGNOSTICS", "0") == "1"
+instrumentation_state = threading.local() # streamlit runs every session in its own thread
+instrumentation_logger = logging.getLogger("vm_right_sizing.instrumentation")
+if diagnostics_enabled and not instrumentation_logger.handlers:
+    instrumentation_logger.addHandler(logging.StreamHandler())
+    instrumentation_logger.setLevel(logging.INFO)
+
+######################
+# Instrumentation
+######################
+# Start collecting instrumentation records for the current session / script run, returns the (filled later on) list of records
+def start_instrumentation(session_id, enabled=None, records=None):
+    instrumentation_state.enabled = diagnostics_enabled if enabled is None else enabled
+    instrumentation_state.session_id = session_id
+    instrumentation_state.records = [] if records is None else records
+    instrumentation_state.stack = []
+    return instrumentation_state.records
+
+# Decorator: record wall time & row counts of a function (a single attribute lookup if disabled)
+def instrumented(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not getattr(instrumentation_state, 'enabled', False):
+            return func(*args, **kwargs)
+        with instrumentation_section(func.__name__, get_row_count(args[0]) if args else None) as record:
+            result = func(*args, **kwargs)
+            record['rows_out'] = get_row_count(result)
+        return result
+    return wrapper
+
+# Context manager for instrumenting a code block - the yielded record can be extended (e.g. rows_out)
+@contextmanager
+def instrumentation_section(stage_name, rows_in=None):
+
+    if not getattr(instrumentation_state, 'enabled', False):
+        yield {}
+        return
+
+    # memory is measured for the whole process (peak RSS) - it includes other sessions running at the same time, the growth of
+    # the peak during a stage is an upper bound of what the stage needs (tracemalloc is process wide as well & can't be reset per session)
+    record = {'session': instrumentation_state.session_id, 'stage': stage_name, 'seconds': None, 'process_peak_rss_mib': None, 'process_peak_rss_growth_mib': None, 'rows_in': rows_in, 'rows_out': None, 'cache': None, 'error': None}
+    instrumentation_state.stack.append(record)
+    start_peak_rss_mib = get_process_peak_rss_mib()
+    start_time = time.perf_counter()
+    try:
+        yield record
+    except Exception as e:
+        record['error'] = type(e).__name__
+        raise
+    finally:
+        record['seconds'] = round(time.perf_counter() - start_time, 4)
+        if start_peak_rss_mib is not None:
+            record['process_peak_rss_mib'] = get_process_peak_rss_mib()
+            record['process_peak_rss_growth_mib'] = round(record['process_peak_rss_mib'] - start_peak_rss_mib, 2)
+        instrumentation_state.stack.pop()
+        instrumentation_state.records.append(record)
+        instrumentation_logger.info(json.dumps(record)) # one structured log line per stage
+
+# Peak resident memory of the whole process so far in MiB (None if not available on this platform)
+def get_process_peak_rss_mib():
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss # KiB on Linux, bytes on macOS
+    return round(peak_rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 2)
+
+# Mark the currently running instrumented stage as cache 'hit' or 'miss'
+def set_instrumentation_cache_status(status):
+    if getattr(instrumentation_state, 'enabled', False) and instrumentation_state.stack:
+        instrumentation_state.stack[-1]['cache'] = status
+
+# Number of rows of dataframes / stylers (first element for tuples), None for everything else
+def get_row_count(value):
+    if isinstance(value, tuple) and value:
+        value = value[0]
+    value = getattr(value, 'data', value) # Styler
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(value.shape[0])
+    return None
 
 ######################
 # Custom Functions
@@ -26,11 +199,30 @@ def local_css(file_name):
         #st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
         return f.read()
 
-# Generate Dataframe from Excel and make neccessary adjustment for easy consumption later on
-@st.cache
-def get_data_from_excel(uploaded_file):
+# Generate Dataframe from Excel - served from the on-disk cache if the same export has been parsed before
+# (file_hash can be passed if already known, e.g. from get_upload_hash, so the file is not hashed again)
+@instrumented
+def get_data_from_excel(uploaded_file, progress=None, file_hash=None):
+
+    file_hash = file_hash or get_file_hash(uploaded_file)
+    main_df = read_from_disk_cache(file_hash)
+    set_instrumentation_cache_status('miss' if main_df is None else 'hit')
+    if main_df is None:
+        main_df = parse_collector_excel(uploaded_file, progress)
+        write_to_disk_cache(file_hash, main_df)
+        shared_df = read_from_disk_cache(file_hash) # continue with the memory-mapped dataset, like every other session
+        if shared_df is not None:
+            main_df = shared_df
+    main_df.attrs['file_hash'] = file_hash # identifies the dataset for derived caches (e.g. aggregation cube)
+    if getattr(instrumentation_state, 'enabled', False) and instrumentation_state.stack:
+        instrumentation_state.stack[-1]['bytes_per_vm'] = round(get_memory_report(main_df)[1], 1)
+
+    return main_df
 
-    df = pd.ExcelFile(uploaded_file, engine="openpyxl")
+# Parse Excel and make neccessary adjustment for easy consumption later on
+# progress (optional dict) receives rows parsed per tab, setting progress['cancelled'] aborts the parse with CancelledError
+@instrumented
+def parse_collector_excel(uploaded_file, progress=None):
 
     # Columns to Read from Excel file
     vInfo_cols_to_use = ["VM Name","Power State","Cluster Name","MOID"]
@@ -38,13 +230,8 @@ def get_data_from_excel(uploaded_file):
     vMemory_cols_to_use = ["Size (MiB)","Peak %","Average %","Median %","95th Percentile % (recommended)","MOID"]
 
     # Create df for each tab with only relevant columns
-    df_vInfo = df.parse('vInfo', usecols=vInfo_cols_to_use)
-    df_vInfo.convert_dtypes().dtypes # autoset datatypes to reduce memory consumption    
-    df_vCPU = df.parse('vCPU', usecols=vCPU_cols_to_use)
-    df_vCPU.convert_dtypes().dtypes # autoset datatypes to reduce memory consumption    
-    df_vMemory = df.parse('vMemory', usecols=vMemory_cols_to_use)
-    df_vMemory.convert_dtypes().dtypes # autoset datatypes to reduce memory consumption    
-
+    sheet_dfs = read_collector_sheets(uploaded_file, {'vInfo': vInfo_cols_to_use, 'vCPU': vCPU_cols_to_use, 'vMemory': vMemory_cols_to_use}, progress)
+    df_vInfo, df_vCPU, df_vMemory = sheet_dfs['vInfo'], sheet_dfs['vCPU'], sheet_dfs['vMemory']
 
     # Rename columns to make it shorter
     df_vCPU.rename(columns={'95th Percentile % (recommended)': '95th Percentile %'}, inplace=True)
@@ -61,38 +248,343 @@ def get_data_from_excel(uploaded_file):
 
     # Add / Generate Total Columns from vCPU performance percentage data & convert columns to right datatype to reduce memory coonsumption
     df_vCPU['vCPUs'] = df_vCPU['vCPUs'].astype(np.int16)
-    df_vCPU['vCPU Peak %'] = df_vCPU['vCPU Peak %'].astype(np.float32)
-    df_vCPU.loc[:,'vCPU Peak #'] = df_vCPU.apply(lambda row: get_vCPU_total_values(row, 'vCPU Peak %'), axis=1).astype(np.int16)
-    df_vCPU['vCPU Average %'] = df_vCPU['vCPU Average %'].astype(np.float32)
-    df_vCPU.loc[:,'vCPU Average #'] = df_vCPU.apply(lambda row: get_vCPU_total_values(row, 'vCPU Average %'), axis=1).astype(np.int16)
-    df_vCPU['vCPU Median %'] = df_vCPU['vCPU Median %'].astype(np.float32)
-    df_vCPU.loc[:,'vCPU Median #'] = df_vCPU.apply(lambda row: get_vCPU_total_values(row, 'vCPU Median %'), axis=1).astype(np.int16)
-    df_vCPU['vCPU 95th Percentile %'] = df_vCPU['vCPU 95th Percentile %'].astype(np.float32)
-    df_vCPU.loc[:,'vCPU 95th Percentile #'] = df_vCPU.apply(lambda row: get_vCPU_total_values(row, 'vCPU 95th Percentile %'), axis=1).astype(np.int16)
+    for performance_type in performance_types:
+        df_vCPU['vCPU ' + performance_type + ' %'] = df_vCPU['vCPU ' + performance_type + ' %'].astype(np.float32)
+        df_vCPU.loc[:,'vCPU ' + performance_type + ' #'] = get_vCPU_total_values_vectorized(df_vCPU['vCPUs'].to_numpy(), df_vCPU['vCPU ' + performance_type + ' %'].to_numpy()).astype(np.int16)
 
     # Add / Generate Total Columns from vMemory performance percentage data & convert columns to right datatype to reduce memory coonsumption
     df_vMemory['vMemory Size (GiB)'] = df_vMemory['vMemory Size (GiB)'].astype(np.float32)
-    df_vMemory['vMemory Peak %'] = df_vMemory['vMemory Peak %'].astype(np.float32)
-    df_vMemory.loc[:,'vMemory Peak #'] = df_vMemory.apply(lambda row: get_vMemory_total_values(row, 'vMemory Peak %'), axis=1).astype(np.float32)
-    df_vMemory['vMemory Average %'] = df_vMemory['vMemory Average %'].astype(np.float32)
-    df_vMemory.loc[:,'vMemory Average #'] = df_vMemory.apply(lambda row: get_vMemory_total_values(row, 'vMemory Average %'), axis=1).astype(np.float32)
-    df_vMemory['vMemory Median %'] = df_vMemory['vMemory Median %'].astype(np.float32)
-    df_vMemory.loc[:,'vMemory Median #'] = df_vMemory.apply(lambda row: get_vMemory_total_values(row, 'vMemory Median %'), axis=1).astype(np.float32)
-    df_vMemory['vMemory 95th Percentile %'] = df_vMemory['vMemory 95th Percentile %'].astype(np.float32)
-    df_vMemory.loc[:,'vMemory 95th Percentile #'] = df_vMemory.apply(lambda row: get_vMemory_total_values(row, 'vMemory 95th Percentile %'), axis=1).astype(np.float32)
+    for performance_type in performance_types:
+        df_vMemory['vMemory ' + performance_type + ' %'] = df_vMemory['vMemory ' + performance_type + ' %'].astype(np.float32)
+        df_vMemory.loc[:,'vMemory ' + performance_type + ' #'] = get_vMemory_total_values_vectorized(df_vMemory['vMemory Size (GiB)'].to_numpy(), df_vMemory['vMemory ' + performance_type + ' %'].to_numpy()).astype(np.float32)
 
     df_vinfo_vcpu_merged = pd.merge(df_vInfo, df_vCPU, left_on="MOID", right_on="vCPU MOID", how="left")
     main_df = pd.merge(df_vinfo_vcpu_merged, df_vMemory, left_on="MOID", right_on="vMemory MOID", how="left")
-    main_df.drop(['MOID','vCPU MOID','vMemory MOID'], axis=1, inplace=True) # Drop no lomnger needed columns after merge
+    main_df.drop(['vCPU MOID','vMemory MOID'], axis=1, inplace=True) # Drop no lomnger needed columns after merge
+    main_df.set_index('MOID', inplace=True) # MOID identifies the VM across exports (history, compare)
 
     # Change column order to be more logic & easier to read
     main_df = main_df[['VM Name', 'Power State', 'Cluster Name', 'vCPUs', 'vCPU Peak %', 'vCPU Peak #', 'vCPU Average %', 'vCPU Average #', 'vCPU Median %', 'vCPU Median #', 'vCPU 95th Percentile %', 'vCPU 95th Percentile #', 'vMemory Size (GiB)', 'vMemory Peak %', 'vMemory Peak #', 'vMemory Average %', 'vMemory Average #', 'vMemory Median %', 'vMemory Median #', 'vMemory 95th Percentile %', 'vMemory 95th Percentile #']]
+    main_df = compact_main_df(main_df)
 
     #print (main_df.info())
 
     return main_df
 
+# Convert merged dataframe to compact datatypes: categoricals for low cardinality strings, int16 / float32 for all metrics.
+# VMs missing in the vCPU tab turn the int16 columns into float64 during the left merge - these get a nullable Int16 instead.
+def compact_main_df(main_df):
+
+    main_df = main_df.copy()
+    for column in ['Power State', 'Cluster Name']:
+        main_df[column] = main_df[column].astype('category')
+    for column in ['vCPUs', 'vCPU Peak #', 'vCPU Average #', 'vCPU Median #', 'vCPU 95th Percentile #']:
+        main_df[column] = main_df[column].astype('Int16' if main_df[column].isna().any() else np.int16)
+    for column in main_df.columns[4:]:
+        if pd.api.types.is_float_dtype(main_df[column].dtype):
+            main_df[column] = main_df[column].astype(np.float32)
+
+    return main_df
+
+# Generate memory report of dataframe: bytes per column (incl. strings) & bytes per VM
+def get_memory_report(main_df):
+
+    memory_report_df = main_df.memory_usage(index=True, deep=True).rename('Bytes').to_frame()
+    memory_report_df.insert(0, 'Datatype', [str(main_df.index.dtype)] + [str(dtype) for dtype in main_df.dtypes])
+    memory_report_df['Bytes per VM'] = (memory_report_df['Bytes'] / max(len(main_df), 1)).round(1)
+    bytes_per_vm = memory_report_df['Bytes'].sum() / max(len(main_df), 1)
+
+    return memory_report_df, bytes_per_vm
+
+# Generate sha256 content hash of uploaded file (file path or file-like object)
+def get_file_hash(uploaded_file):
+
+    file_hash = hashlib.sha256()
+    if hasattr(uploaded_file, "read"):
+        uploaded_file.seek(0)
+        for chunk in iter(lambda: uploaded_file.read(1024 * 1024), b""):
+            file_hash.update(chunk)
+        uploaded_file.seek(0) # rewind so the file can be parsed afterwards
+    else:
+        with open(uploaded_file, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                file_hash.update(chunk)
+
+    return file_hash.hexdigest()
+
+# Content hash of a streamlit upload - only hashed once per upload (file_id), reruns get the hash from upload_hashes (session state)
+def get_upload_hash(uploaded_file, upload_hashes):
+
+    file_id = getattr(uploaded_file, 'file_id', None)
+    if file_id is None:
+        return get_file_hash(uploaded_file)
+    if file_id not in upload_hashes:
+        upload_hashes[file_id] = get_file_hash(uploaded_file)
+        while len(upload_hashes) > upload_hashes_max_entries:
+            upload_hashes.pop(next(iter(upload_hashes))) # drop oldest upload
+    return upload_hashes[file_id]
+
+# Read parsed dataframe from on-disk cache, returns None if not cached.
+# The cache file (Arrow IPC, uncompressed) is memory-mapped once per process: numeric & string columns are zero-copy,
+# read-only views of the file - all sessions (and worker processes) share the same pages instead of holding own copies.
+def read_from_disk_cache(file_hash):
+
+    with shared_datasets_lock:
+        if file_hash in shared_datasets:
+            shared_datasets.move_to_end(file_hash)
+            return shared_datasets[file_hash]
+
+    cache_file = get_cache_file(file_hash)
+    if not os.path.exists(cache_file):
+        return None
+    try:
+        cached_table = pa.ipc.open_file(pa.memory_map(cache_file)).read_all()
+        cached_df = cached_table.to_pandas(split_blocks=True, types_mapper=get_shared_dataset_dtype)
+    except Exception: # unreadable / partially written file - treat as cache miss
+        return None
+    os.utime(cache_file) # mark as recently used for LRU eviction
+
+    with shared_datasets_lock:
+        cached_df = shared_datasets.setdefault(file_hash, cached_df) # another session may have mapped it in the meantime
+        shared_datasets.move_to_end(file_hash)
+        while len(shared_datasets) > shared_datasets_max_entries:
+            shared_datasets.popitem(last=False) # sessions still using an evicted dataset keep their reference
+
+    return cached_df
+
+# Strings stay in the mapped Arrow buffers (no python string object per VM), all other columns use the stored pandas dtypes
+def get_shared_dataset_dtype(arrow_type):
+    return pd.ArrowDtype(arrow_type) if arrow_type == pa.string() else None
+
+# Write parsed dataframe to on-disk cache and evict least recently used files above max cache size
+def write_to_disk_cache(file_hash, main_df):
+
+    try:
+        os.makedirs(cache_directory, exist_ok=True)
+        cache_file = get_cache_file(file_hash)
+        temp_file = cache_file + "." + str(os.getpid()) + ".tmp"
+        main_table = pa.Table.from_pandas(main_df, preserve_index=True)
+        # NaN stays a float value instead of an Arrow null - columns without nulls can be mapped without copy
+        main_table = pa.Table.from_arrays([
+            pa.array(main_df[column].to_numpy(), from_pandas=False) if column in main_df.columns and pd.api.types.is_float_dtype(main_df[column].dtype) else main_table.column(column)
+            for column in main_table.column_names
+        ], schema=main_table.schema)
+        with pa.OSFile(temp_file, 'wb') as f:
+            with pa.ipc.new_file(f, main_table.schema) as writer:
+                writer.write_table(main_table)
+        os.replace(temp_file, cache_file) # atomic, concurrent readers never see a partial file
+        evict_disk_cache(cache_max_size_bytes)
+    except OSError: # cache is best effort only, e.g. read-only filesystem
+        pass
+
+# Path of the cache file for a content hash
+def get_cache_file(file_hash):
+    return os.path.join(cache_directory, file_hash + "-v" + str(cache_format_version) + ".arrow")
+
+# Delete least recently used cache files until the cache fits into max_size_bytes
+def evict_disk_cache(max_size_bytes):
+
+    cache_files = [entry for entry in os.scandir(cache_directory) if entry.name.endswith((".arrow", ".parquet"))] # incl. files of older versions
+    cache_files.sort(key=lambda entry: entry.stat().st_mtime, reverse=True) # most recently used first
+    total_size = 0
+    for entry in cache_files:
+        total_size += entry.stat().st_size
+        if total_size > max_size_bytes:
+            os.remove(entry.path)
+
+# Read all tabs - large exports are parsed concurrently (one worker process per tab, tabs are independent of each other)
+def read_collector_sheets(uploaded_file, sheet_cols_to_use, progress=None):
+
+    if progress is None:
+        progress = {}
+    if sheet_parse_workers < 2 or get_file_size(uploaded_file) < sheet_parse_concurrent_min_bytes:
+        return read_collector_sheets_in_process(uploaded_file, sheet_cols_to_use, progress)
+
+    # every worker opens the workbook itself - uploads are written once to a temp file, files are passed by path
+    temp_file = None
+    if hasattr(uploaded_file, 'read'):
+        uploaded_file.seek(0)
+        with tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False) as f:
+            while True:
+                file_chunk = uploaded_file.read(1024 * 1024)
+                if not file_chunk:
+                    break
+                f.write(file_chunk)
+            temp_file = f.name
+        uploaded_file.seek(0)
+    executor = get_sheet_parse_executor()
+    try:
+        return read_collector_sheets_concurrently(executor, temp_file or uploaded_file, sheet_cols_to_use, progress)
+    except BrokenProcessPool:
+        # a worker process died (e.g. killed because of memory) - start new workers for the next upload, parse this one here
+        sheet_parse_logger.warning("sheet parse worker processes broken, parsing %s in process", ", ".join(sheet_cols_to_use))
+        reset_sheet_parse_executor(executor)
+        return read_collector_sheets_in_process(uploaded_file, sheet_cols_to_use, progress)
+    finally:
+        if temp_file is not None:
+            os.remove(temp_file)
+
+# Read all tabs one after another in this process
+def read_collector_sheets_in_process(uploaded_file, sheet_cols_to_use, progress):
+
+    # Open workbook in read-only mode - sheets are streamed on demand, unused tabs & cell styles are never loaded
+    from openpyxl import load_workbook
+    workbook = load_workbook(uploaded_file, read_only=True, data_only=True)
+    try:
+        return {sheet_name: read_sheet_columns(workbook, sheet_name, cols_to_use, progress) for sheet_name, cols_to_use in sheet_cols_to_use.items()}
+    finally:
+        workbook.close() # read-only workbooks keep the file handle open until closed
+
+# Read all tabs in the worker processes (one per tab) - raises BrokenProcessPool if a worker process died
+def read_collector_sheets_concurrently(executor, file_path, sheet_cols_to_use, progress):
+
+    worker_progress = get_parse_progress_manager().dict() # shared with the worker processes
+    futures = {sheet_name: executor.submit(parse_sheet, file_path, sheet_name, cols_to_use, worker_progress) for sheet_name, cols_to_use in sheet_cols_to_use.items()}
+    try:
+        pending = set(futures.values())
+        while pending: # relay progress & cancellation between the caller and the worker processes
+            done, pending = wait(pending, timeout=0.2)
+            progress.update({sheet_name: rows for sheet_name, rows in worker_progress.copy().items() if sheet_name in futures})
+            if progress.get('cancelled') or any(future.exception() is not None for future in done):
+                worker_progress['cancelled'] = True # stops the remaining tabs early
+    finally:
+        for future in futures.values():
+            future.cancel()
+    if progress.get('cancelled'):
+        raise CancelledError("parse of " + ", ".join(sheet_cols_to_use) + " cancelled")
+    for future in futures.values(): # raise the actual error, not the tabs cancelled because of it
+        if future.exception() is not None and not isinstance(future.exception(), CancelledError):
+            raise future.exception()
+
+    return {sheet_name: future.result() for sheet_name, future in futures.items()}
+
+# Parse a single tab of a Collector export - runs inside a worker process
+def parse_sheet(file_path, sheet_name, cols_to_use, progress=None):
+
+    from openpyxl import load_workbook
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        return read_sheet_columns(workbook, sheet_name, cols_to_use, progress)
+    finally:
+        workbook.close()
+
+# Worker processes for concurrent tab parsing, started on first use
+def get_sheet_parse_executor():
+    global sheet_parse_executor
+    with sheet_parse_lock:
+        if sheet_parse_executor is None:
+            sheet_parse_executor = ProcessPoolExecutor(max_workers=sheet_parse_workers, mp_context=sheet_parse_context)
+        return sheet_parse_executor
+
+# Drop broken worker processes - the next upload starts new ones (unless another session already replaced them)
+def reset_sheet_parse_executor(broken_executor):
+    global sheet_parse_executor
+    broken_executor.shutdown(wait=False, cancel_futures=True)
+    with sheet_parse_lock:
+        if sheet_parse_executor is broken_executor:
+            sheet_parse_executor = None
+
+# Manager process holding the progress dicts shared with the worker processes, started on first use
+def get_parse_progress_manager():
+    global parse_progress_manager
+    with sheet_parse_lock:
+        if parse_progress_manager is None:
+            parse_progress_manager = sheet_parse_context.Manager()
+        return parse_progress_manager
+
+# Size of uploaded file in bytes (file path or file-like object)
+def get_file_size(uploaded_file):
+
+    if not hasattr(uploaded_file, 'read'):
+        return os.path.getsize(uploaded_file)
+    position = uploaded_file.tell()
+    size = uploaded_file.seek(0, os.SEEK_END)
+    uploaded_file.seek(position)
+
+    return size
+
+# Stream the given columns of a sheet row by row into a dataframe (header row is resolved once, all other columns are skipped)
+def read_sheet_columns(workbook, sheet_name, cols_to_use, progress=None):
+
+    worksheet = workbook[sheet_name]
+    total_rows = worksheet.max_row - 1 if worksheet.max_row else None # from the sheet dimension, not every export contains it
+    rows = worksheet.iter_rows(values_only=True)
+    header = [str(value).strip() if value is not None else None for value in next(rows, ())]
+
+    missing_columns = [column for column in cols_to_use if column not in header]
+    if missing_columns:
+        raise ValueError("Tab '" + sheet_name + "' is missing the following columns: " + ", ".join(missing_columns))
+    column_indexes = [header.index(column) for column in cols_to_use]
+
+    # Cells are written into buffers preallocated from the sheet dimension (grown if it is missing or too small): float buffers
+    # (empty cells = NaN) as long as a column only contains numbers, an object buffer from the first text value of a column on
+    buffer_rows = total_rows if total_rows and total_rows > 0 else 1024
+    column_buffers = [np.full(buffer_rows, np.nan) for _ in cols_to_use]
+    numeric_columns = [True] * len(cols_to_use)
+    vm_rows = 0
+    row_number = 0
+    for row_number, row in enumerate(rows, start=1):
+        if progress is not None and row_number % sheet_parse_progress_rows == 0:
+            report_parse_progress(progress, sheet_name, row_number, total_rows)
+        row_values = [row[index] if index < len(row) else None for index in column_indexes]
+        if all(value is None for value in row_values): # skip blank rows like pandas does
+            continue
+        if vm_rows == buffer_rows:
+            column_buffers = [grow_column_buffer(column_buffer) for column_buffer in column_buffers]
+            buffer_rows *= 2
+        for column_index, value in enumerate(row_values):
+            if value is None:
+                continue
+            if numeric_columns[column_index] and (not isinstance(value, (int, float)) or isinstance(value, bool)):
+                column_buffers[column_index] = get_object_column_buffer(column_buffers[column_index], vm_rows)
+                numeric_columns[column_index] = False
+            column_buffers[column_index][vm_rows] = value
+        vm_rows += 1
+    if progress is not None:
+        report_parse_progress(progress, sheet_name, row_number, row_number)
+
+    sheet_df = pd.DataFrame({column: column_buffer[:vm_rows] for column, column_buffer in zip(cols_to_use, column_buffers)})
+
+    return sheet_df
+
+# Store rows parsed / total rows of a tab in the progress dict, abort if the parse has been cancelled in the meantime
+def report_parse_progress(progress, sheet_name, rows, total_rows):
+    if progress.get('cancelled'):
+        raise CancelledError("parse of '" + sheet_name + "' cancelled")
+    progress[sheet_name] = (rows, total_rows)
+
+# Start parsing an upload in a background thread, the streamlit script stays responsive and can show the progress meanwhile.
+# Returns the job: future (main_df), progress (rows parsed per tab), file_hash & instrumentation records of the parse
+def start_background_parse(uploaded_file, file_hash=None):
+
+    parse_job = {'file_hash': file_hash or get_file_hash(uploaded_file), 'progress': {}, 'records': []}
+    upload_copy = BytesIO(uploaded_file.getvalue()) if hasattr(uploaded_file, 'getvalue') else uploaded_file # own file position, the script keeps using the upload
+    parse_job['future'] = background_parse_executor.submit(run_background_parse, upload_copy, parse_job['progress'], getattr(instrumentation_state, 'session_id', None), getattr(instrumentation_state, 'enabled', False), parse_job['records'], parse_job['file_hash'])
+
+    return parse_job
+
+# Body of the background parse - instrumentation is thread local, so the session is continued in the background thread
+def run_background_parse(uploaded_file, progress, session_id, instrumentation_enabled, records, file_hash=None):
+    start_instrumentation(session_id, instrumentation_enabled, records)
+    return get_data_from_excel(uploaded_file, progress, file_hash)
+
+# Cancel a superseded parse - a running parse stops at its next progress report, a queued one never starts
+def cancel_background_parse(parse_job):
+    parse_job['progress']['cancelled'] = True
+    parse_job['future'].cancel()
+
+# Double the size of a column buffer (new rows are empty: NaN / None)
+def grow_column_buffer(column_buffer):
+    return np.concatenate([column_buffer, np.full(len(column_buffer), np.nan if column_buffer.dtype != object else None, dtype=column_buffer.dtype)])
+
+# Convert the float buffer of a column with text values to an object buffer - NaN becomes None, whole numbers become int again
+def get_object_column_buffer(column_buffer, rows):
+    object_buffer = np.full(len(column_buffer), None, dtype=object)
+    object_buffer[:rows] = [None if value != value else int(value) if value.is_integer() else value for value in column_buffer[:rows].tolist()]
+    return object_buffer
+
 #def upload_to_aws(data):
+#    import boto3
 #    s3_client = boto3.client('s3', aws_access_key_id=st.secrets["s3_access_key_id"],
 #                      aws_secret_access_key=st.secrets["s3_secret_access_key"])
 #
@@ -110,7 +602,7 @@ def get_vCPU_total_values(df_row, compare_value):
     if pd.isna(df_row[compare_value]):
         get_total_value = df_row['vCPUs'] # if no data is available use provisioned vCPU data
     else:
-        get_total_value = df_row['vCPUs'] * (df_row[compare_value]/100)* 1.2
+        get_total_value = df_row['vCPUs'] * (df_row[compare_value]/100)* default_buffer_factor
         if(get_total_value) < 1:
             get_total_value = 1
         if(get_total_value) > df_row['vCPUs']:
@@ -124,7 +616,7 @@ def get_vMemory_total_values(df_row, compare_value):
     if pd.isna(vMemory_perf_value):
         get_total_value = vMemory_row_value # if no data is available use provisioned vMemory data
     else:
-        get_total_value = vMemory_row_value * (vMemory_perf_value/100)* 1.2
+        get_total_value = vMemory_row_value * (vMemory_perf_value/100)* default_buffer_factor
         if np.less(get_total_value, 1):
             if np.less(vMemory_row_value, 1):
                 get_total_value = vMemory_row_value
@@ -136,34 +628,161 @@ def get_vMemory_total_values(df_row, compare_value):
             get_total_value = np.ceil(get_total_value)
     return get_total_value
 
-# Generate vCPU Overview Section for streamlit column 1+2
-@st.cache
+# Generate vCPU Values for a whole column at once - same rules as get_vCPU_total_values, but computed with numpy over all VMs
+# buffer_factor may be an array, e.g. shape (n, 1) returns the values for n buffer factors at once (broadcasting)
+def get_vCPU_total_values_vectorized(vCPUs, perf_values, buffer_factor=default_buffer_factor):
+    vCPUs = np.asarray(vCPUs, dtype=np.float64)
+    perf_values = np.asarray(perf_values, dtype=np.float64)
+    get_total_values = vCPUs * (perf_values/100) * buffer_factor
+    get_total_values = np.minimum(np.maximum(get_total_values, 1), vCPUs)
+    get_total_values = np.where(np.isnan(perf_values), vCPUs, get_total_values) # if no data is available use provisioned vCPU data
+    return np.ceil(get_total_values)
+
+# Generate vMemory Values for a whole column at once - same rules as get_vMemory_total_values, but computed with numpy over all VMs
+def get_vMemory_total_values_vectorized(vMemory_values, perf_values, buffer_factor=default_buffer_factor):
+    vMemory_values = np.asarray(vMemory_values, dtype=np.float64)
+    perf_values = np.asarray(perf_values, dtype=np.float64)
+    get_total_values = vMemory_values * (perf_values/100) * buffer_factor
+    get_total_values = np.select(
+        [get_total_values < 1, get_total_values > vMemory_values],
+        [np.where(vMemory_values < 1, vMemory_values, 1), vMemory_values],
+        default=np.ceil(get_total_values)
+    )
+    get_total_values = np.where(np.isnan(perf_values), vMemory_values, get_total_values) # if no data is available use provisioned vMemory data
+    return get_total_values
+
+# What-if sweep: provisioned vs right sized totals for all buffer factors x performance types x resources at once.
+# The VM columns are broadcast against the buffer factors - the dataframe is never recomputed per setting.
+@instrumented
+def generate_what_if_sweep(custom_df, buffer_factors=None):
+
+    buffer_factors = np.asarray(what_if_buffer_factors if buffer_factors is None else buffer_factors, dtype=np.float64)
+    df_performance_types = get_performance_types(custom_df)
+    what_if_columns = {'Resource': [], 'Performance Type': [], 'Buffer Factor': [], 'Provisioned': [], 'Right-Sized': []}
+    for resource, provisioned_column, get_total_values_vectorized in [('vCPU', 'vCPUs', get_vCPU_total_values_vectorized), ('vMemory', 'vMemory Size (GiB)', get_vMemory_total_values_vectorized)]:
+        provisioned_values = custom_df[provisioned_column].to_numpy(dtype=np.float64, na_value=np.nan)
+        for performance_type in df_performance_types:
+            perf_values = custom_df[resource + ' ' + performance_type + ' %'].to_numpy(dtype=np.float64, na_value=np.nan)
+            # shape (buffer factors, VMs) - VMs without provisioned value are skipped like in the overview sums
+            right_sized_totals = np.nansum(get_total_values_vectorized(provisioned_values, perf_values, buffer_factors[:, None]), axis=1)
+            what_if_columns['Resource'] += [resource] * len(buffer_factors)
+            what_if_columns['Performance Type'] += [performance_type] * len(buffer_factors)
+            what_if_columns['Buffer Factor'] += list(buffer_factors)
+            what_if_columns['Provisioned'] += [np.nansum(provisioned_values)] * len(buffer_factors)
+            what_if_columns['Right-Sized'] += list(right_sized_totals)
+
+    what_if_df = pd.DataFrame(what_if_columns)
+    what_if_df['Savings'] = what_if_df['Provisioned'] - what_if_df['Right-Sized']
+    what_if_df['Savings %'] = (what_if_df['Savings'] / what_if_df['Provisioned'].where(what_if_df['Provisioned'] > 0) * 100).round(1)
+
+    return what_if_df
+
+# Filter VMs by cluster & power state with a boolean mask - if all VMs are selected, the shared dataset itself is returned (no copy)
+def filter_main_df(main_df, vCluster_selected, powerstate_selected):
+
+    return get_filtered_df(main_df, get_selected_vms(main_df, vCluster_selected, powerstate_selected))
+
+# Rows of main_df selected by a boolean mask - main_df itself (no copy) if every VM is selected
+def get_filtered_df(main_df, selected_vms):
+
+    if selected_vms.all():
+        return main_df
+
+    return main_df[selected_vms]
+
+# Boolean mask of the VMs matching the cluster & power state filter
+def get_selected_vms(main_df, vCluster_selected, powerstate_selected):
+    return main_df['Cluster Name'].isin(vCluster_selected).to_numpy() & main_df['Power State'].isin(powerstate_selected).to_numpy()
+
+# Get aggregation cube for dataset - only computed once per dataset content hash
+@instrumented
+def get_aggregation_cube(main_df):
+
+    file_hash = main_df.attrs.get('file_hash')
+    if file_hash is None: # dataset not loaded via get_data_from_excel - no key to cache on
+        return generate_aggregation_cube(main_df)
+    with aggregation_cubes_lock:
+        aggregation_cube = aggregation_cubes.get(file_hash)
+        if aggregation_cube is not None:
+            aggregation_cubes.move_to_end(file_hash)
+    set_instrumentation_cache_status('miss' if aggregation_cube is None else 'hit')
+
+    if aggregation_cube is None:
+        aggregation_cube = generate_aggregation_cube(main_df)
+        with aggregation_cubes_lock:
+            aggregation_cubes[file_hash] = aggregation_cube
+            while len(aggregation_cubes) > aggregation_cubes_max_entries:
+                aggregation_cubes.popitem(last=False) # evict least recently used
+
+    return aggregation_cube
+
+# Pre-aggregate sums, VM counts & 5% histogram buckets per Cluster Name & Power State, so filter changes do not touch every VM again
+def generate_aggregation_cube(main_df):
+
+    df_performance_types = get_performance_types(main_df)
+    sum_columns = ['vCPUs'] + ['vCPU ' + performance_type + ' #' for performance_type in df_performance_types] \
+        + ['vMemory Size (GiB)'] + ['vMemory ' + performance_type + ' #' for performance_type in df_performance_types]
+    histogram_columns = [prefix + performance_type + ' %' for prefix in ['vCPU ', 'vMemory '] for performance_type in df_performance_types]
+
+    grouped = main_df.groupby(['Cluster Name', 'Power State'], sort=True, dropna=False, observed=True)
+    group_ids = grouped.ngroup().to_numpy()
+    group_count = grouped.ngroups
+
+    # sums & counts - float64 sums to avoid precision loss of float32 columns
+    aggregation_cube_df = main_df[sum_columns].astype(np.float64).groupby([main_df['Cluster Name'], main_df['Power State']], sort=True, dropna=False, observed=True).sum()
+    aggregation_cube_df.insert(0, 'VMs', grouped.size().to_numpy())
+
+    # histogram buckets identical to np.histogram(values, bins=range(0, 105, 5)): [0,5), [5,10), ... [95,100]
+    histogram_counts = []
+    for column in histogram_columns:
+        values = main_df[column].to_numpy(dtype=np.float64, na_value=np.nan)
+        valid = (values >= 0) & (values <= 100) # NaN is never valid
+        buckets = np.minimum((values[valid] // 5).astype(np.int64), 19)
+        histogram_counts.append(np.bincount(group_ids[valid] * 20 + buckets, minlength=group_count * 20).reshape(group_count, 20))
+    histogram_cube_df = pd.DataFrame(
+        np.stack(histogram_counts, axis=1).reshape(group_count * len(histogram_columns), 20),
+        index=pd.MultiIndex.from_tuples(
+            [group + (column,) for group in aggregation_cube_df.index for column in histogram_columns],
+            names=['Cluster Name', 'Power State', 'Metric']),
+        columns=list(range(0, 100, 5))
+    )
+
+    return aggregation_cube_df, histogram_cube_df
+
+# Select the cube rows matching the multiselect filters (works for aggregation & histogram cube)
+def filter_aggregation_cube(cube_df, vCluster_selected, powerstate_selected):
+
+    selected_rows = cube_df.index.get_level_values('Cluster Name').isin(vCluster_selected) & cube_df.index.get_level_values('Power State').isin(powerstate_selected)
+
+    return cube_df[selected_rows]
+
+# Get performance types available in dataframe / cube (Collector types first, then additional types in column order)
+def get_performance_types(df):
+    additional_types = [column[len('vCPU '):-len(' #')] for column in df.columns if column.startswith('vCPU ') and column.endswith(' #') and column[len('vCPU '):-len(' #')] not in performance_types]
+    return [performance_type for performance_type in performance_types if 'vCPU ' + performance_type + ' #' in df.columns] + additional_types
+
+# Generate vCPU Overview Section for streamlit column 1+2 (reruns reuse the result via the aggregation cube & computation graph)
+@instrumented
 def generate_vCPU_overview_df(custom_df):
 
+    df_performance_types = get_performance_types(custom_df)
     vCPU_provisioned = int(custom_df["vCPUs"].sum())
-    vCPU_peak = int(custom_df["vCPU Peak #"].sum())
-    vCPU_average = int(custom_df["vCPU Average #"].sum())
-    vCPU_median = int(custom_df["vCPU Median #"].sum())
-    vCPU_95_percentile = int(custom_df["vCPU 95th Percentile #"].sum())
-    vCPU_overview_first_column = {'': ["# vCPUs - Provisioned", "# vCPUs - Peak", "# vCPUs - Average", "# vCPUs - Median", "# vCPUs - 95th Percentile"]}
+    vCPU_overview_first_column = {'': ["# vCPUs - Provisioned"] + ["# vCPUs - " + performance_type for performance_type in df_performance_types]}
     vCPU_overview_df = pd.DataFrame(vCPU_overview_first_column)
-    vCPU_overview_second_column = [vCPU_provisioned, vCPU_peak, vCPU_average, vCPU_median, vCPU_95_percentile]
+    vCPU_overview_second_column = [vCPU_provisioned] + [int(custom_df["vCPU " + performance_type + " #"].sum()) for performance_type in df_performance_types]
     vCPU_overview_df.loc[:,'vCPU'] = vCPU_overview_second_column
 
     return vCPU_overview_df
 
-# Generate vMemory Overview Section for streamlit column 1+2
-@st.cache(allow_output_mutation=True)
+# Generate vMemory Overview Section for streamlit column 1+2 (reruns reuse the result via the aggregation cube & computation graph)
+@instrumented
 def generate_vMemory_overview_df(custom_df):
 
+    df_performance_types = get_performance_types(custom_df)
     vMemory_provisioned = custom_df["vMemory Size (GiB)"].sum()
-    vMemory_peak = custom_df["vMemory Peak #"].sum()
-    vMemory_average = custom_df["vMemory Average #"].sum()
-    vMemory_median = custom_df["vMemory Median #"].sum()
-    vMemory_95_percentile = custom_df["vMemory 95th Percentile #"].sum()
-    vMemory_overview_first_column = {'': ["# vMemory - Provisioned", "# vMemory - Peak", "# vMemory - Average", "# vMemory - Median", "# vMemory - 95th Percentile"]}
+    vMemory_overview_first_column = {'': ["# vMemory - Provisioned"] + ["# vMemory - " + performance_type for performance_type in df_performance_types]}
     vMemory_overview_df = pd.DataFrame(vMemory_overview_first_column)
-    vMemory_overview_second_column = [vMemory_provisioned, vMemory_peak, vMemory_average, vMemory_median, vMemory_95_percentile]
+    vMemory_overview_second_column = [vMemory_provisioned] + [custom_df["vMemory " + performance_type + " #"].sum() for performance_type in df_performance_types]
     vMemory_overview_df.loc[:,'GiB'] = vMemory_overview_second_column
 
     # Style data values to two decimals and set default value in case of NAN
@@ -171,19 +790,105 @@ def generate_vMemory_overview_df(custom_df):
    
     return vMemory_overview_df
 
+# Key of a chart in the figure cache - everything the chart depends on, cheap to build & compare (no dataframe hashing).
+# Returns None for datasets without content hash (not loaded via get_data_from_excel), these charts are not cached.
+def get_figure_cache_key(main_df, vCluster_selected, powerstate_selected, performance_type_selected, resource, chart_name):
+
+    file_hash = main_df.attrs.get('file_hash')
+    if file_hash is None:
+        return None
+
+    return (file_hash, tuple(sorted(vCluster_selected)), tuple(sorted(powerstate_selected)), performance_type_selected, resource, chart_name)
+
+# Get chart figure & config from the figure cache - generate_chart(*args) is only called (and serialized once) on a miss
+@instrumented
+def get_cached_chart(figure_key, generate_chart, *args):
+
+    if figure_key is None:
+        return generate_chart(*args)
+    with figure_cache_lock:
+        cached_chart = figure_cache.get(figure_key)
+        if cached_chart is not None:
+            figure_cache.move_to_end(figure_key)
+            figure_cache_stats['hits'] += 1
+    set_instrumentation_cache_status('miss' if cached_chart is None else 'hit')
+
+    if cached_chart is None:
+        chart, chart_config = generate_chart(*args)
+        cached_chart = (chart.to_json(), chart_config) # background image is encoded once here, not on every rerun
+        with figure_cache_lock:
+            figure_cache_stats['misses'] += 1
+            figure_cache[figure_key] = cached_chart
+            while len(figure_cache) > figure_cache_max_entries:
+                figure_cache.popitem(last=False) # evict least recently used
+                figure_cache_stats['evictions'] += 1
+
+    import plotly.io as pio
+    return pio.from_json(cached_chart[0]), dict(cached_chart[1])
+
+# Hit / miss counters & hit rate of the figure cache (since start of the app)
+def get_figure_cache_stats():
+
+    with figure_cache_lock:
+        figure_cache_stats_copy = dict(figure_cache_stats, entries=len(figure_cache))
+    lookups = figure_cache_stats_copy['hits'] + figure_cache_stats_copy['misses']
+    figure_cache_stats_copy['hit_rate'] = round(figure_cache_stats_copy['hits'] / lookups, 3) if lookups else None
+
+    return figure_cache_stats_copy
+
+# Computation graph of one session (see app_computation_nodes): last value, input keys & version per node, hit / recompute counters
+def create_computation_graph():
+    return {'nodes': {}, 'stats': {node_name: {'hits': 0, 'recomputes': 0} for node_name in app_computation_nodes}}
+
+# Hashable keys of the app inputs a node can depend on
+def get_computation_inputs(main_df, vCluster_selected, powerstate_selected, performance_type_selected):
+    return {
+        'dataset': main_df.attrs.get('file_hash', id(main_df)),
+        'filters': (tuple(sorted(vCluster_selected)), tuple(sorted(powerstate_selected))),
+        'performance_type': performance_type_selected,
+    }
+
+# Value of a node - compute(*args) is only called if an input or upstream node changed since the last rerun, otherwise the last value is returned.
+# Upstream nodes have to be computed before (in the same rerun), their version is part of the key.
+def compute_node(computation_graph, computation_inputs, node_name, compute, *args):
+
+    input_names, upstream_nodes = app_computation_nodes[node_name]
+    input_keys = tuple(computation_inputs[input_name] for input_name in input_names) + tuple(computation_graph['nodes'][upstream_node]['version'] for upstream_node in upstream_nodes)
+    node = computation_graph['nodes'].get(node_name)
+    node_stats = computation_graph['stats'][node_name]
+    if node is not None and node['input_keys'] == input_keys:
+        node_stats['hits'] += 1
+        return node['value']
+
+    value = compute(*args)
+    computation_graph['nodes'][node_name] = {'input_keys': input_keys, 'value': value, 'version': node_stats['recomputes'] + 1}
+    node_stats['recomputes'] += 1
+
+    return value
+
+# Hit / recompute counters per node of a computation graph
+def get_computation_graph_stats(computation_graph):
+
+    stats_df = pd.DataFrame.from_dict(computation_graph['stats'], orient='index', columns=['hits', 'recomputes'])
+    stats_df.index.name = 'Node'
+    stats_df['hit_rate'] = (stats_df['hits'] / (stats_df['hits'] + stats_df['recomputes'])).round(3)
+
+    return stats_df
+
 # Generate Bar charts for vCPU & vMemory
-@st.cache
+@instrumented
 def generate_bar_charts(df_vCPU_or_vMemory, y_axis_name):
 
-    bar_chart_names = ['Provisioned', 'Peak', 'Average', 'Median', '95th Percentile']
+    bar_chart_names = [row_name.split(' - ', 1)[1] for row_name in df_vCPU_or_vMemory['']] # e.g. "# vCPUs - Peak" -> "Peak"
 
+    import plotly.express as px
     bar_chart = px.bar(
                 df_vCPU_or_vMemory,
                 x = "",
                 y = y_axis_name,
                 text=bar_chart_names
             )
-    bar_chart.update_traces(marker_color=['#F36D21', '#4C4C4E', '#6560AB', '#3ABFEF', '#034EA2'])
+    bar_chart.update_traces(marker_color=[bar_chart_colors[min(i, len(bar_chart_colors) - 1)] for i in range(len(bar_chart_names))])
     bar_chart.update_layout(
             margin=dict(l=10, r=10, t=20, b=10,pad=4), autosize=True, height = 350, 
             xaxis={'visible': False, 'showticklabels': False}
@@ -197,17 +902,21 @@ def generate_bar_charts(df_vCPU_or_vMemory, y_axis_name):
     return bar_chart, bar_chart_config
 
 # Generate Histogram charts for vCPU & vMemory
-@st.cache
-def generate_histogram_charts(custom_df, y_axis_name, performance_type_selected):
+@instrumented
+def generate_histogram_charts(histogram_cube_df, y_axis_name, performance_type_selected):
 
     if y_axis_name == "vMemory Size (GiB)":
         prefix_string = "vMemory "
     else:
         prefix_string = "vCPU "
 
-    counts, bins = np.histogram(custom_df[prefix_string + performance_type_selected+" %"] , bins=range(0, 105, 5))
+    # counts of the 5% buckets are summed up from the (filtered) histogram cube
+    metric_rows = histogram_cube_df.index.get_level_values('Metric') == prefix_string + performance_type_selected+" %"
+    counts = histogram_cube_df[metric_rows].to_numpy().sum(axis=0)
+    bins = np.arange(0, 105, 5)
     bins = 0.5 * (bins[:-1] + bins[1:])
 
+    import plotly.express as px
     histogram_chart = px.bar(
             x=bins,
             y=counts, 
@@ -228,20 +937,32 @@ def generate_histogram_charts(custom_df, y_axis_name, performance_type_selected)
     return histogram_chart, histogram_chart_config
 
 # Generate Scatter charts for vCPU & vMemory
-@st.cache
-def generate_scatter_charts(custom_df, y_axis_name, performance_type_selected):
+@instrumented
+def generate_scatter_charts(custom_df, y_axis_name, performance_type_selected, max_points=None):
 
     if y_axis_name == "vMemory Size (GiB)":
         prefix_string = "vMemory "
     else:
         prefix_string = "vCPU "
-
+    x_axis_name = prefix_string + performance_type_selected+" %"
+    total_column = prefix_string + performance_type_selected+" #"
+
+    # Only the plotted columns are sent to the browser - large datasets are reduced to at most max_points markers
+    point_indexes, point_counts = downsample_scatter_points(custom_df[x_axis_name].to_numpy(dtype=np.float64, na_value=np.nan), custom_df[y_axis_name].to_numpy(dtype=np.float64, na_value=np.nan), max_points or scatter_max_points)
+    scatter_df = custom_df.iloc[point_indexes][["VM Name", x_axis_name, y_axis_name, total_column]]
+    hover_data = {x_axis_name: ':.2f', total_column: True}
+    if (point_counts > 1).any():
+        scatter_df = scatter_df.assign(**{'Anzahl VMs': point_counts}) # number of VMs represented by a marker
+        hover_data['Anzahl VMs'] = True
+
+    import plotly.express as px
     scatter_chart = px.scatter(        
-                custom_df,
-                x = prefix_string + performance_type_selected+" %",
+                scatter_df,
+                x = x_axis_name,
                 y = y_axis_name,
                 hover_name="VM Name",
-                hover_data=[prefix_string + performance_type_selected+" #"]
+                hover_data=hover_data,
+                render_mode="webgl"
             )
     scatter_chart.update_traces(marker=dict(size=6,color='#034EA2'))
 
@@ -258,66 +979,206 @@ def generate_scatter_charts(custom_df, y_axis_name, performance_type_selected):
 
     return scatter_chart, scatter_chart_config
 
+# Generate savings curves of the what-if sweep for vCPU or vMemory (one line per performance type)
+@instrumented
+def generate_what_if_charts(what_if_df, resource):
+
+    unit_string = "vCPUs" if resource == "vCPU" else "GiB"
+    import plotly.express as px
+    what_if_chart = px.line(
+                what_if_df[what_if_df['Resource'] == resource],
+                x = 'Buffer Factor',
+                y = 'Savings',
+                color = 'Performance Type',
+                markers = True,
+                hover_data = {'Right-Sized': ':.0f', 'Savings %': True},
+                labels = {'Savings': 'Einsparung (' + unit_string + ')', 'Buffer Factor': 'Puffer Faktor', 'Performance Type': ''},
+                color_discrete_sequence = bar_chart_colors[1:]
+            )
+    what_if_chart.add_vline(x=default_buffer_factor, line_dash="dot", line_color="#F36D21") # buffer used for all other values on this page
+
+    what_if_chart.update_layout(
+            margin=dict(l=10, r=10, t=20, b=10,pad=4), autosize=True, height = 350,
+            legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+        )
+    what_if_chart.update_xaxes(dtick=0.05)
+
+    what_if_chart.add_layout_image(background_image)
+    what_if_chart_config = { 
+            "displaylogo": False, 'modeBarButtonsToRemove': ['zoom2d', 'toggleSpikelines', 'pan2d', 'select2d',
+             'lasso2d', 'autoScale2d', 'hoverClosestCartesian', 'hoverCompareCartesian']
+        }
+
+    return what_if_chart, what_if_chart_config
+
+# Reduce scatter points to at most max_points via density binning: points in sparse cells (outliers) are all kept,
+# dense cells are represented by one of their points. Returns positional indexes & number of VMs represented per point.
+def downsample_scatter_points(x_values, y_values, max_points):
+
+    valid_indexes = np.flatnonzero(~np.isnan(x_values) & ~np.isnan(y_values)) # points without values are not plotted anyway
+    if len(valid_indexes) <= max_points:
+        return valid_indexes, np.ones(len(valid_indexes), dtype=np.int64)
+
+    # grid size guarantees at most max_points markers (every cell contributes max scatter_outlier_cell_size points)
+    bins_per_axis = max(int(np.sqrt(max_points / scatter_outlier_cell_size)), 1)
+    x_bins = get_bin_indexes(x_values[valid_indexes], bins_per_axis)
+    y_bins = get_bin_indexes(np.log1p(np.maximum(y_values[valid_indexes], 0)), bins_per_axis) # log scale as vCPU / GiB sizes are skewed
+    _, first_indexes, cell_inverse, cell_counts = np.unique(x_bins * bins_per_axis + y_bins, return_index=True, return_inverse=True, return_counts=True)
+
+    sparse_points = np.flatnonzero(cell_counts[cell_inverse] <= scatter_outlier_cell_size)
+    dense_cells = np.flatnonzero(cell_counts > scatter_outlier_cell_size)
+    kept_points = np.concatenate([sparse_points, first_indexes[dense_cells]])
+    kept_counts = np.concatenate([np.ones(len(sparse_points), dtype=np.int64), cell_counts[dense_cells]])
+    order = np.argsort(kept_points, kind='stable')
+
+    return valid_indexes[kept_points[order]], kept_counts[order]
+
+# Map values to equally sized bins between their min and max
+def get_bin_indexes(values, bin_count):
+    value_range = values.max() - values.min()
+    if value_range == 0:
+        return np.zeros(len(values), dtype=np.int64)
+    return np.minimum(((values - values.min()) / value_range * bin_count).astype(np.int64), bin_count - 1)
+
 # Generate df for output on streamlit dataframe
+@instrumented
 def generate_results_df_for_output(custom_df, vm_detail_columns_to_show):
 
+    # drop columns based on multiselect - before styling, only the selected columns are copied
+    custom_df = drop_columns_based_on_multiselect(custom_df, vm_detail_columns_to_show)
+
     # Style data values to two decimals and set default value in case of NAN
     custom_df = custom_df.style.format(precision=2, na_rep='nicht vorhanden')
 
-    # drop columns based on multiselect
-    custom_df.data = drop_columns_based_on_multiselect(custom_df.data, vm_detail_columns_to_show)
-
     return custom_df
 
+# Positions (in main_df) of the VM Details rows in display order: filtered, optionally searched by VM Name & sorted by a column.
+# Sorting uses the precomputed order of the whole dataset, filtered by the mask in O(n) - the result is cached, so page flips only slice.
+@instrumented
+def get_vm_details_rows(main_df, vCluster_selected, powerstate_selected, sort_column=None, ascending=True, search=''):
+
+    search = search.strip()
+    file_hash = main_df.attrs.get('file_hash')
+    row_order_key = (file_hash, tuple(sorted(vCluster_selected)), tuple(sorted(powerstate_selected)), sort_column, ascending, search.lower())
+    with vm_details_lock:
+        row_positions = vm_details_row_orders.get(row_order_key) if file_hash is not None else None
+        if row_positions is not None:
+            vm_details_row_orders.move_to_end(row_order_key)
+    set_instrumentation_cache_status('miss' if row_positions is None else 'hit')
+    if row_positions is not None:
+        return row_positions
+
+    selected_vms = get_selected_vms(main_df, vCluster_selected, powerstate_selected)
+    if search:
+        selected_vms &= main_df['VM Name'].str.contains(search, case=False, regex=False, na=False).to_numpy(dtype=bool)
+    if sort_column is None:
+        row_positions = np.flatnonzero(selected_vms).astype(np.int32)
+    else:
+        sort_order = get_vm_details_sort_order(main_df, sort_column, ascending)
+        row_positions = sort_order[selected_vms[sort_order]]
+
+    if file_hash is not None:
+        with vm_details_lock:
+            vm_details_row_orders[row_order_key] = row_positions
+            while len(vm_details_row_orders) > vm_details_row_orders_max_entries:
+                vm_details_row_orders.popitem(last=False) # evict least recently used
+
+    return row_positions
+
+# Order of all VMs of the dataset by a column (stable, empty values last) - computed once per dataset, column & direction
+def get_vm_details_sort_order(main_df, sort_column, ascending=True):
+
+    sort_order_key = (main_df.attrs.get('file_hash'), sort_column, ascending)
+    with vm_details_lock:
+        sort_order = vm_details_sort_orders.get(sort_order_key) if sort_order_key[0] is not None else None
+    if sort_order is not None:
+        return sort_order
+
+    # codes of the sorted distinct values (any dtype, -1 for empty values) - reversed for descending, empty values moved to the end in both directions
+    sort_codes, sorted_values = pd.factorize(main_df[sort_column], sort=True)
+    sort_keys = sort_codes if ascending else len(sorted_values) - 1 - sort_codes
+    sort_keys[sort_codes < 0] = len(sorted_values)
+    sort_order = np.argsort(sort_keys, kind='stable').astype(np.int32) # stable: ties keep the order of the dataset
+
+    if sort_order_key[0] is not None:
+        with vm_details_lock:
+            vm_details_sort_orders[sort_order_key] = sort_order
+            while len(vm_details_sort_orders) > vm_details_sort_orders_max_entries:
+                vm_details_sort_orders.popitem(last=False) # evict least recently used
+
+    return sort_order
+
+# Styled page of the VM Details table - only the rows of this page & the selected columns are copied and formatted
+def get_vm_details_page(main_df, row_positions, vm_detail_columns_to_show, page_number, page_rows=None):
+
+    page_rows = page_rows or vm_details_page_rows
+    page_positions = row_positions[(page_number - 1) * page_rows:page_number * page_rows]
+    column_positions = [main_df.columns.get_loc(column) for column in main_df.columns if column in vm_detail_columns_to_show]
+    page_df = main_df.iloc[page_positions, column_positions]
+
+    # Style data values to two decimals and set default value in case of NAN
+    return page_df.style.format(precision=2, na_rep='nicht vorhanden')
+
 # drop columns based on multiselect
+# (projection instead of dropping in place - the dataset is shared by all sessions and read-only)
 def drop_columns_based_on_multiselect(new_df, vm_detail_columns_to_show): 
 
-    for column in new_df.columns.values:
-        if column not in vm_detail_columns_to_show:
-            new_df.drop(columns=column, inplace=True)
+    new_df = new_df[[column for column in new_df.columns if column in vm_detail_columns_to_show]]
     
     return new_df
 
 # Generate dataframe as excel file for downloads
 #@st.cache - I do not think cache helps here, as it gets regenerated after a change / download
+@instrumented
 def download_as_excel(output_to_show, vCPU_overview, vMemory_overview):
 
+    # Styler objects are accepted as well, only the underlying data is written
+    vm_details_df = getattr(output_to_show, 'data', output_to_show)
+    vCPU_overview = getattr(vCPU_overview, 'data', vCPU_overview)
+    vMemory_overview = getattr(vMemory_overview, 'data', vMemory_overview)
+
+    # Large exports are streamed row by row to temp files (constant_memory) instead of keeping every cell in memory.
+    # Excel tables are not supported in this mode, therefore an autofilter is used for the VM Details instead.
+    constant_memory = len(vm_details_df) >= excel_constant_memory_min_rows
+
     output = BytesIO()
-    writer = pd.ExcelWriter(output, engine='xlsxwriter')
-    output_to_show.to_excel(writer, index=False, sheet_name='VM Details', startrow=4, startcol=0, float_format='%.2f')
-    workbook = writer.book
-    worksheet_vm_details = writer.sheets['VM Details']
+    import xlsxwriter
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': constant_memory, 'nan_inf_to_errors': True})
     header_format = workbook.add_format({'bold': True, 'font_color': '#034EA2','font_size':18})
     subheader_format = workbook.add_format({'bold': True, 'font_color': '#000000','font_size':14})
-    
-    for col in range(21): #set column width for cells
-        worksheet_vm_details.set_column(col, col, 25)
+    table_header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+
+    # constant_memory requires all rows of a worksheet to be written in ascending order
+    worksheet_vm_details = workbook.add_worksheet('VM Details')
     worksheet_vm_details.write(0, 0, "VM Right Sizing Analyse - VM Details",header_format)
     worksheet_vm_details.write(2, 0, "Bitte Anmerkungen auf gesondertem Tabellenblatt beachten.")
     worksheet_vm_details.freeze_panes(5, 0)
-    format_dataframe_as_table(writer, 'VM Details', output_to_show.data)
+    write_dataframe_to_worksheet(workbook, worksheet_vm_details, vm_details_df, 4, table_header_format, column_width=25)
+    if constant_memory:
+        worksheet_vm_details.autofilter(4, 0, 4 + len(vm_details_df), max(len(vm_details_df.columns) - 1, 0))
+    else:
+        format_dataframe_as_table(worksheet_vm_details, vm_details_df)
 
-    vCPU_overview.to_excel(writer, index=False, sheet_name='Uebersicht', startrow=4, startcol=0)
-    vMemory_overview.to_excel(writer, index=False, sheet_name='Uebersicht', startrow=21, startcol=0)
-    worksheet_uebersicht = writer.sheets['Uebersicht']
-    
-    for col in range(2): #set column width for cells
-        worksheet_uebersicht.set_column(col, col, 25)
+    worksheet_uebersicht = workbook.add_worksheet('Uebersicht')
     worksheet_uebersicht.write(0, 0, "VM Right Sizing Analyse - Uebersicht",header_format)
     worksheet_uebersicht.write(2, 0, "vCPU Gesamt-Auswertung:", subheader_format)
+    write_dataframe_to_worksheet(workbook, worksheet_uebersicht, vCPU_overview, 4, table_header_format, column_width=25, round_floats=False)
     worksheet_uebersicht.write(19, 0, "vMemory Gesamt-Auswertung:", subheader_format)
+    write_dataframe_to_worksheet(workbook, worksheet_uebersicht, vMemory_overview, 21, table_header_format, column_width=25, round_floats=False)
 
     # Charts are independent of worksheets
     chart_vcpu = workbook.add_chart({'type': 'column'})
     chart_vcpu.set_legend({'none': True})
     chart_vram = workbook.add_chart({'type': 'column'})
     chart_vram.set_legend({'none': True})
-    diff_color_list = list([{ 'fill': { 'color':'#F36D21' }}, { 'fill': { 'color':'#4C4C4E' }}, { 'fill': { 'color':'#6560AB' }}, { 'fill': { 'color':'#3ABFEF' }}, { 'fill': { 'color':'#034EA2' }}])
+    diff_color_list = list([{ 'fill': { 'color':bar_chart_colors[min(i, len(bar_chart_colors) - 1)] }} for i in range(len(vCPU_overview))])
 
-    chart_vcpu.add_series({'categories': '=Uebersicht!$A$6:$A$10','values': '=Uebersicht!$B$6:$B$10', 'points':diff_color_list })
+    vCPU_last_row = str(5 + len(vCPU_overview))
+    chart_vcpu.add_series({'categories': '=Uebersicht!$A$6:$A$' + vCPU_last_row,'values': '=Uebersicht!$B$6:$B$' + vCPU_last_row, 'points':diff_color_list })
     worksheet_uebersicht.insert_chart('D3', chart_vcpu)
 
-    chart_vram.add_series({'categories': '=Uebersicht!$A$23:$A$27','values': '=Uebersicht!$B$23:$B$27', 'points':diff_color_list })
+    vMemory_last_row = str(22 + len(vMemory_overview))
+    chart_vram.add_series({'categories': '=Uebersicht!$A$23:$A$' + vMemory_last_row,'values': '=Uebersicht!$B$23:$B$' + vMemory_last_row, 'points':diff_color_list })
     worksheet_uebersicht.insert_chart('D20', chart_vram)
 
     worksheet_anmerkungen = workbook.add_worksheet('Anmerkungen')
@@ -331,43 +1192,125 @@ def download_as_excel(output_to_show, vCPU_overview, vMemory_overview):
     worksheet_anmerkungen.write(6, 0, "Solch ein VM Right Sizing bietet sich vor der Beschaffung einer neuen Infrastruktur an, sollte aber auch darüber hinaus regelmäßig und wiederkehrend durchgeführt werden. Nutanix bietet diese Funktionalität ebenfalls bereits als einen integrierten Bestandteil des Prism PRO Funktionsumfanges. Hierbei werden umfangreichere Analysen durchgeführt die sich über einen längeren Zeitraum erstrecken und weitere Mehrwerte bieten.", cell_format)
     worksheet_anmerkungen.write(8, 0, "Disclaimer: Die automatische Auswertung basiert auf einem Hobby Projekt und dient primär als Anhaltspunkt für ein mögliches Right Sizing - keine Garantie auf Vollständigkeit oder Korrektheit der Auswertung / Daten.", cell_format) 
 
-    writer.close()
+    workbook.close()
     processed_data = output.getvalue()
 
     return processed_data
 
-# Format dataframe as table in excel
-def format_dataframe_as_table(writer, sheet_name, output_to_show):
-    outcols = output_to_show.columns
-    if len(outcols) > 25:
-        raise ValueError('table width out of range for current logic')
-    tbl_hdr = [{'header':c} for c in outcols]
-    bottom_num = len(output_to_show)+1
-    right_letter = chr(65-1+len(outcols))
-    tbl_corner = right_letter + str(bottom_num+4)
-    worksheet = writer.sheets[sheet_name]
-    worksheet.add_table('A5:' + tbl_corner,  {'columns':tbl_hdr})
+# Write dataframe with header row into worksheet starting at start_row - values are converted column wise, number formats are set per column
+def write_dataframe_to_worksheet(workbook, worksheet, df, start_row, header_format, column_width=None, round_floats=True):
+
+    number_format = workbook.add_format({'num_format': '0.00'})
+    column_values = []
+    cell_writers = []
+    for col, column in enumerate(df.columns):
+        values = df[column].to_numpy()
+        if pd.api.types.is_float_dtype(values.dtype):
+            values = values.astype(np.float64)
+            if round_floats:
+                values = np.round(values, 2) # same values as the former float_format='%.2f'
+            worksheet.set_column(col, col, column_width, number_format if round_floats else None)
+            values = np.where(np.isnan(values), None, values).tolist() # empty cell for missing values
+            cell_writers.append(worksheet.write_number)
+        elif pd.api.types.is_numeric_dtype(df[column].dtype) and not pd.api.types.is_bool_dtype(df[column].dtype):
+            worksheet.set_column(col, col, column_width)
+            values = [None if pd.isna(value) else value for value in df[column].tolist()] if df[column].hasnans else df[column].tolist()
+            cell_writers.append(worksheet.write_number)
+        else:
+            worksheet.set_column(col, col, column_width)
+            values = [None if pd.isna(value) else str(value) for value in values.tolist()]
+            cell_writers.append(worksheet.write_string)
+        column_values.append(values)
+
+    worksheet.write_row(start_row, 0, [str(column) for column in df.columns], header_format)
+    for row, row_values in enumerate(zip(*column_values), start=start_row + 1):
+        for col, value in enumerate(row_values):
+            if value is not None:
+                cell_writers[col](row, col, value)
+
+# Format dataframe as table in excel (header in row 5) - numeric range, so any number of columns is supported
+def format_dataframe_as_table(worksheet, output_to_show):
+    tbl_hdr = [{'header':str(c)} for c in output_to_show.columns]
+    worksheet.add_table(4, 0, 4 + len(output_to_show), max(len(tbl_hdr) - 1, 0), {'columns':tbl_hdr})
+
+# Generate VM Details in one of the export_formats as chunks of bytes (see generate_csv_chunks / generate_parquet_chunks)
+def generate_export_chunks(output_to_show, export_format):
+    if export_format == 'parquet':
+        return generate_parquet_chunks(output_to_show)
+    return generate_csv_chunks(output_to_show, compress=export_format == 'csv.gz')
+
+# Generate VM Details as csv (optionally gzip compressed) - yields the file in chunks of export_chunk_rows rows, the whole file is never held in memory
+def generate_csv_chunks(output_to_show, compress=False, chunk_rows=None):
+
+    vm_details_df = getattr(output_to_show, 'data', output_to_show) # Styler objects are accepted as well
+    chunk_rows = chunk_rows or export_chunk_rows
+    compressor = zlib.compressobj(wbits=31) if compress else None # wbits=31: gzip container
+
+    for start_row in range(0, max(len(vm_details_df), 1), chunk_rows):
+        csv_chunk = vm_details_df.iloc[start_row:start_row + chunk_rows].to_csv(header=start_row == 0, float_format='%.2f').encode('utf-8')
+        csv_chunk = compressor.compress(csv_chunk) if compressor else csv_chunk
+        if csv_chunk:
+            yield csv_chunk
+    if compressor:
+        yield compressor.flush()
+
+# Generate VM Details as parquet - one row group per chunk of export_chunk_rows rows, yields the bytes written so far after each row group
+def generate_parquet_chunks(output_to_show, chunk_rows=None):
+
+    import pyarrow.parquet as pq # only needed for this export
+    vm_details_df = getattr(output_to_show, 'data', output_to_show) # Styler objects are accepted as well
+    chunk_rows = chunk_rows or export_chunk_rows
+    parquet_sink = ExportChunkSink()
+
+    parquet_writer = None
+    for start_row in range(0, max(len(vm_details_df), 1), chunk_rows):
+        parquet_table = pa.Table.from_pandas(vm_details_df.iloc[start_row:start_row + chunk_rows], preserve_index=True)
+        if parquet_writer is None:
+            parquet_writer = pq.ParquetWriter(parquet_sink, parquet_table.schema)
+        parquet_writer.write_table(parquet_table, row_group_size=chunk_rows)
+        yield parquet_sink.pop_chunk()
+    parquet_writer.close() # writes the footer
+    yield parquet_sink.pop_chunk()
+
+# Write-only file object for generated exports - collects the written bytes until they are handed out with pop_chunk
+class ExportChunkSink:
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def pop_chunk(self):
+        chunk = b''.join(self.chunks)
+        self.chunks = []
+        return chunk
 
 # generate the values required for the savings text string
 def get_savings_value(performance_type_selected,vCPU_overview,vMemory_overview):
 
-    if performance_type_selected == '95th Percentile':
-        savings_vCPU = int(vCPU_overview.iat[0,1])-int(vCPU_overview.iat[4,1])
-        savings_vMemory = int(vMemory_overview.iat[0,1])-int(vMemory_overview.iat[4,1])
-    elif performance_type_selected == "Peak":
-        savings_vCPU = int(vCPU_overview.iat[0,1])-int(vCPU_overview.iat[1,1])
-        savings_vMemory = int(vMemory_overview.iat[0,1])-int(vMemory_overview.iat[1,1])
-    elif performance_type_selected == "Average":
-        savings_vCPU = int(vCPU_overview.iat[0,1])-int(vCPU_overview.iat[2,1])
-        savings_vMemory = int(vMemory_overview.iat[0,1])-int(vMemory_overview.iat[2,1])
-    elif performance_type_selected == "Median":
-        savings_vCPU = int(vCPU_overview.iat[0,1])-int(vCPU_overview.iat[3,1])
-        savings_vMemory = int(vMemory_overview.iat[0,1])-int(vMemory_overview.iat[3,1])
+    # overview rows are named "# vCPUs - <performance type>" / "# vMemory - <performance type>", first row is provisioned
+    vCPU_row = list(vCPU_overview.iloc[:,0]).index("# vCPUs - " + performance_type_selected)
+    vMemory_row = list(vMemory_overview.iloc[:,0]).index("# vMemory - " + performance_type_selected)
+    savings_vCPU = int(vCPU_overview.iat[0,1])-int(vCPU_overview.iat[vCPU_row,1])
+    savings_vMemory = int(vMemory_overview.iat[0,1])-int(vMemory_overview.iat[vMemory_row,1])
 
     return savings_vCPU, savings_vMemory
 
 # generates the default columns to show of the tables based on selectbox value
-def get_default_columns_to_show(performance_type_selected):
+def get_default_columns_to_show(performance_type_selected, columns=None):
 
     if performance_type_selected == '95th Percentile':
         columns_to_show = [0,1,2,3,10,11,12,19,20]
@@ -377,6 +1320,10 @@ def get_default_columns_to_show(performance_type_selected):
         columns_to_show = [0,1,2,3,6,7,12,15,16]
     elif performance_type_selected == "Median":
         columns_to_show = [0,1,2,3,8,9,12,17,18]
+    else: # additional performance types (e.g. custom percentiles) are looked up by column name
+        columns = list(columns)
+        columns_to_show = [0,1,2,3] + [columns.index('vCPU ' + performance_type_selected + suffix) for suffix in [' %', ' #']] \
+            + [12] + [columns.index('vMemory ' + performance_type_selected + suffix) for suffix in [' %', ' #']]
 
     return columns_to_show
 
@@ -388,4 +1335,5 @@ def get_default_columns_to_show(performance_type_selected):
 #    # Send a Slack message to a channel via a webhook. 
 #    webhook = aws_access_key_id=st.secrets["slack_webhook_url"]
 #    payload = {"text": payload}
+#    import requests
 #    requests.post(webhook, json.dumps(payload))
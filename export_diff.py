@@ -0,0 +1,147 @@
+import argparse
+import os
+import threading
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import custom_functions
+
+######################
+# Before / after comparison of two Collector exports of the same environment (e.g. before and after right sizing)
+# Both exports are parsed with get_data_from_excel (MOID is the index) and joined on MOID with one hash lookup per export -
+# all deltas are computed column-wise over the joined arrays, no row is compared on its own.
+# Usage: python export_diff.py collector_before.xlsx collector_after.xlsx --output-dir diff
+######################
+
+vm_diff_statuses = ['added', 'removed', 'resized', 'unchanged']
+
+# diffs of the most recently compared exports (keyed by content hash of both exports & performance type)
+export_diffs = OrderedDict()
+export_diffs_max_entries = 4
+export_diffs_lock = threading.Lock()
+
+# Provisioned resources, utilization & right sized demand of the performance type - the compared values per VM
+def get_diff_columns(performance_type_selected='95th Percentile'):
+    return ['vCPUs', 'vCPU ' + performance_type_selected + ' %', 'vCPU ' + performance_type_selected + ' #',
+            'vMemory Size (GiB)', 'vMemory ' + performance_type_selected + ' %', 'vMemory ' + performance_type_selected + ' #']
+
+# Per VM deltas between two exports: before / after / delta of every diff column & status (added, removed, resized, unchanged)
+def diff_exports(before_df, after_df, performance_type_selected='95th Percentile'):
+
+    before_df = before_df[~before_df.index.duplicated(keep='first')] # MOID has to be unique within one export
+    after_df = after_df[~after_df.index.duplicated(keep='first')]
+
+    # all MOIDs: VMs of the before export in their order, then the added VMs
+    all_moids = before_df.index.append(after_df.index[~after_df.index.isin(before_df.index)])
+    before_rows = np.arange(len(all_moids))
+    before_rows[len(before_df):] = -1
+    after_rows = after_df.index.get_indexer(all_moids)
+    in_before = before_rows >= 0
+    in_after = after_rows >= 0
+
+    # VM Name of the after export (of the before export for removed VMs), Cluster of both exports (VMs can move between clusters)
+    vm_name_values = np.empty(len(all_moids), dtype=object)
+    vm_name_values[in_before] = before_df['VM Name'].to_numpy(dtype=object)
+    vm_name_values[in_after] = after_df['VM Name'].to_numpy(dtype=object)[after_rows[in_after]]
+    vm_diff_columns = {'VM Name': vm_name_values}
+    vm_diff_columns['Cluster Name Before'] = np.full(len(all_moids), None, dtype=object)
+    vm_diff_columns['Cluster Name Before'][in_before] = before_df['Cluster Name'].to_numpy(dtype=object)
+    vm_diff_columns['Cluster Name After'] = np.full(len(all_moids), None, dtype=object)
+    vm_diff_columns['Cluster Name After'][in_after] = after_df['Cluster Name'].to_numpy(dtype=object)[after_rows[in_after]]
+
+    status = np.full(len(all_moids), 'unchanged', dtype=object)
+    resized = np.zeros(len(all_moids), dtype=bool)
+    for column in get_diff_columns(performance_type_selected):
+        before_values = np.full(len(all_moids), np.nan)
+        before_values[in_before] = before_df[column].to_numpy(dtype=np.float64, na_value=np.nan)
+        after_values = np.full(len(all_moids), np.nan)
+        after_values[in_after] = after_df[column].to_numpy(dtype=np.float64, na_value=np.nan)[after_rows[in_after]]
+        vm_diff_columns[column + ' Before'] = before_values
+        vm_diff_columns[column + ' After'] = after_values
+        vm_diff_columns[column + ' Delta'] = after_values - before_values
+        if column in ['vCPUs', 'vMemory Size (GiB)']:
+            resized |= in_before & in_after & ~np.isclose(before_values, after_values, equal_nan=True)
+    status[resized] = 'resized'
+    status[~in_before] = 'added'
+    status[~in_after] = 'removed'
+    vm_diff_columns['Status'] = status
+
+    vm_diff_df = pd.DataFrame(vm_diff_columns, index=all_moids.rename('MOID'))
+    vm_diff_df['Status'] = pd.Categorical(vm_diff_df['Status'], categories=vm_diff_statuses)
+
+    return vm_diff_df[['VM Name', 'Cluster Name Before', 'Cluster Name After', 'Status'] + [column + suffix for column in get_diff_columns(performance_type_selected) for suffix in [' Before', ' After', ' Delta']]]
+
+# Per cluster deltas: number of VMs & sums of the provisioned / right sized values before & after, VMs per status.
+# Before values are summed up by the cluster of the before export, after values by the cluster of the after export.
+def diff_clusters(vm_diff_df, performance_type_selected='95th Percentile'):
+
+    sum_columns = [column for column in get_diff_columns(performance_type_selected) if not column.endswith(' %')] # utilization does not add up per cluster
+    cluster_parts = []
+    for side, side_status, status_counts in [('Before', 'added', ['removed']), ('After', 'removed', ['added', 'resized'])]:
+        side_df = vm_diff_df[vm_diff_df['Status'] != side_status] # VMs of this export
+        side_groups = side_df.groupby('Cluster Name ' + side, sort=True)
+        cluster_part = side_groups[[column + ' ' + side for column in sum_columns]].sum(min_count=0)
+        cluster_part.insert(0, 'VMs ' + side, side_groups.size())
+        for status in status_counts:
+            cluster_part['VMs ' + status.capitalize()] = (side_df['Status'] == status).groupby(side_df['Cluster Name ' + side], sort=True).sum()
+        cluster_parts.append(cluster_part.rename_axis('Cluster Name'))
+
+    cluster_diff_df = cluster_parts[0].join(cluster_parts[1], how='outer').fillna(0)
+    for column in sum_columns:
+        cluster_diff_df[column + ' Delta'] = cluster_diff_df[column + ' After'] - cluster_diff_df[column + ' Before']
+    vm_count_columns = ['VMs Before', 'VMs After'] + ['VMs ' + status.capitalize() for status in vm_diff_statuses[:3]]
+    cluster_diff_df[vm_count_columns] = cluster_diff_df[vm_count_columns].astype(int)
+
+    return cluster_diff_df[vm_count_columns + [column + suffix for column in sum_columns for suffix in [' Before', ' After', ' Delta']]].round(2)
+
+# Get VM & cluster diff of two parsed exports - only computed once per pair of datasets & performance type
+def get_export_diff(before_df, after_df, performance_type_selected='95th Percentile'):
+
+    cache_key = (before_df.attrs.get('file_hash'), after_df.attrs.get('file_hash'), performance_type_selected)
+    if None in cache_key[:2]:
+        vm_diff_df = diff_exports(before_df, after_df, performance_type_selected)
+        return vm_diff_df, diff_clusters(vm_diff_df, performance_type_selected)
+
+    with export_diffs_lock:
+        export_diff = export_diffs.get(cache_key)
+        if export_diff is not None:
+            export_diffs.move_to_end(cache_key)
+            return export_diff
+
+    vm_diff_df = diff_exports(before_df, after_df, performance_type_selected)
+    export_diff = (vm_diff_df, diff_clusters(vm_diff_df, performance_type_selected))
+    with export_diffs_lock:
+        export_diffs[cache_key] = export_diff
+        while len(export_diffs) > export_diffs_max_entries:
+            export_diffs.popitem(last=False) # evict least recently used
+
+    return export_diff
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Compare two Nutanix Collector exports (e.g. before / after right sizing) per VM & cluster.")
+    parser.add_argument('before', help='earlier Collector export (xlsx)')
+    parser.add_argument('after', help='later Collector export (xlsx)')
+    parser.add_argument('--performance-type', default='95th Percentile', choices=['95th Percentile', 'Peak', 'Average', 'Median'])
+    parser.add_argument('--output-dir', default=None, help='directory for vm_diff.csv & cluster_diff.csv (default: print cluster diff)')
+    args = parser.parse_args(argv)
+
+    warnings.simplefilter("ignore") # Ignore openpyxl Excile File Warning while reading (no default style)
+    before_df = custom_functions.get_data_from_excel(args.before)
+    after_df = custom_functions.get_data_from_excel(args.after)
+    vm_diff_df, cluster_diff_df = get_export_diff(before_df, after_df, args.performance_type)
+
+    print(", ".join("{} {}".format(count, status) for status, count in vm_diff_df['Status'].value_counts(sort=False).items()) + " VMs")
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        vm_diff_df.to_csv(os.path.join(args.output_dir, 'vm_diff.csv'))
+        cluster_diff_df.to_csv(os.path.join(args.output_dir, 'cluster_diff.csv'))
+        print("written to " + args.output_dir)
+    else:
+        print(cluster_diff_df.to_string())
+
+if __name__ == '__main__':
+    main()
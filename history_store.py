@@ -0,0 +1,159 @@
+import argparse
+import json
+import os
+import warnings
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import custom_functions
+
+######################
+# Append-only history of Collector exports for the same environment (keyed by MOID & export timestamp)
+# Every export is stored once as its own Parquet file, the manifest lists all exports in chronological order.
+# Usage: python history_store.py add collector_week_42.xlsx --store history/customer_a
+#        python history_store.py trend --store history/customer_a --column "vCPU 95th Percentile %" --window 4 -o trend.csv
+######################
+
+history_columns = ['VM Name', 'Cluster Name', 'Power State', 'vCPUs', 'vCPU Peak %', 'vCPU Average %', 'vCPU Median %', 'vCPU 95th Percentile %',
+                   'vMemory Size (GiB)', 'vMemory Peak %', 'vMemory Average %', 'vMemory Median %', 'vMemory 95th Percentile %']
+
+# Read manifest (list of stored exports, oldest first)
+def read_manifest(store_directory):
+
+    manifest_file = os.path.join(store_directory, 'manifest.json')
+    if not os.path.exists(manifest_file):
+        return []
+    with open(manifest_file) as f:
+        return json.load(f)
+
+# Write manifest atomically, concurrent readers never see a partial file
+def write_manifest(store_directory, manifest):
+
+    manifest_file = os.path.join(store_directory, 'manifest.json')
+    temp_file = manifest_file + "." + str(os.getpid()) + ".tmp"
+    with open(temp_file, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(temp_file, manifest_file)
+
+# Timestamp of the export: workbook creation date if available, otherwise file modification time / now
+def get_export_timestamp(uploaded_file):
+
+    from openpyxl import load_workbook # only the workbook properties are read, no sheet is parsed
+    try:
+        workbook = load_workbook(uploaded_file, read_only=True)
+        created = workbook.properties.created
+        workbook.close()
+    except Exception:
+        created = None
+    if hasattr(uploaded_file, 'seek'):
+        uploaded_file.seek(0)
+    if created is not None:
+        return created.replace(microsecond=0)
+    if isinstance(uploaded_file, (str, os.PathLike)):
+        return datetime.fromtimestamp(os.path.getmtime(uploaded_file)).replace(microsecond=0)
+    return datetime.now().replace(microsecond=0)
+
+# Parse a new export and append it to the history store - already stored exports (same content hash) are skipped
+def add_export_to_history(store_directory, uploaded_file, export_timestamp=None):
+
+    os.makedirs(store_directory, exist_ok=True)
+    manifest = read_manifest(store_directory)
+    file_hash = custom_functions.get_file_hash(uploaded_file)
+    for export in manifest:
+        if export['file_hash'] == file_hash:
+            return export, False
+
+    export_timestamp = export_timestamp or get_export_timestamp(uploaded_file)
+    main_df = custom_functions.get_data_from_excel(uploaded_file, file_hash=file_hash) # hashed above already
+    export_df = main_df[history_columns]
+    export_df = export_df[~export_df.index.duplicated(keep='first')] # MOID has to be unique within one export
+
+    export = {
+        'export_timestamp': export_timestamp.isoformat(),
+        'file_hash': file_hash,
+        'file': 'export_' + export_timestamp.strftime('%Y%m%d-%H%M%S') + '_' + file_hash[:12] + '.parquet',
+        'vms': int(export_df.shape[0]),
+    }
+    export_df.to_parquet(os.path.join(store_directory, export['file']))
+    manifest.append(export)
+    manifest.sort(key=lambda export: export['export_timestamp'])
+    write_manifest(store_directory, manifest)
+
+    return export, True
+
+# Load one column of the last exports as matrix MOID x export (NaN where the VM did not exist / had no data)
+def get_history_matrix(store_directory, column, last_exports=None):
+
+    manifest = read_manifest(store_directory)
+    if last_exports:
+        manifest = manifest[-last_exports:]
+
+    export_values = []
+    for export in manifest: # only the requested column of the requested exports is read
+        export_values.append(pd.read_parquet(os.path.join(store_directory, export['file']), columns=[column])[column])
+
+    # index all MOIDs once, then scatter every export into its column of the matrix
+    all_moids = pd.Index(pd.unique(np.concatenate([values.index.to_numpy() for values in export_values]))) if export_values else pd.Index([])
+    history_matrix = np.full((len(all_moids), len(export_values)), np.nan, dtype=np.float32)
+    for export_number, values in enumerate(export_values):
+        history_matrix[all_moids.get_indexer(values.index), export_number] = values.to_numpy(dtype=np.float32, na_value=np.nan)
+
+    return pd.DataFrame(history_matrix, index=all_moids.rename('MOID'), columns=[export['export_timestamp'] for export in manifest])
+
+# Per VM rolling max of a column across the last window exports (e.g. 95th percentile across 4 weekly exports)
+def get_rolling_max(store_directory, column='vCPU 95th Percentile %', window=4, last_exports=None):
+
+    history_df = get_history_matrix(store_directory, column, last_exports)
+    history_matrix = history_df.to_numpy()
+    rolling_max = np.full(history_matrix.shape, np.nan, dtype=np.float32)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning) # all-NaN windows stay NaN
+        for export_number in range(history_matrix.shape[1]):
+            rolling_max[:, export_number] = np.nanmax(history_matrix[:, max(0, export_number - window + 1):export_number + 1], axis=1)
+
+    return pd.DataFrame(rolling_max, index=history_df.index, columns=history_df.columns)
+
+# Latest VM Name & Cluster per MOID, to make trend tables readable
+def get_latest_vm_details(store_directory):
+
+    manifest = read_manifest(store_directory)
+    vm_details = [pd.read_parquet(os.path.join(store_directory, export['file']), columns=['VM Name', 'Cluster Name']) for export in manifest]
+    if not vm_details:
+        return pd.DataFrame(columns=['VM Name', 'Cluster Name'])
+    vm_details_df = pd.concat([df.astype({'Cluster Name': object}) for df in vm_details])
+
+    return vm_details_df[~vm_details_df.index.duplicated(keep='last')]
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="History of Nutanix Collector exports for utilization trends.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    add_parser = subparsers.add_parser('add', help='append exports to the history store')
+    add_parser.add_argument('files', nargs='+')
+    add_parser.add_argument('--store', required=True, help='history store directory')
+    add_parser.add_argument('--timestamp', default=None, help='export timestamp (ISO format), default: workbook creation date')
+    trend_parser = subparsers.add_parser('trend', help='per VM rolling max of a column across exports')
+    trend_parser.add_argument('--store', required=True, help='history store directory')
+    trend_parser.add_argument('--column', default='vCPU 95th Percentile %', choices=history_columns[3:])
+    trend_parser.add_argument('--window', type=int, default=4, help='number of exports (e.g. weeks) for the rolling max')
+    trend_parser.add_argument('--last', type=int, default=None, help='only use the last n exports')
+    trend_parser.add_argument('-o', '--output', default=None, help='csv file (default: print)')
+    args = parser.parse_args(argv)
+
+    warnings.simplefilter("ignore") # Ignore openpyxl Excile File Warning while reading (no default style)
+    if args.command == 'add':
+        for file in args.files:
+            export, added = add_export_to_history(args.store, file, datetime.fromisoformat(args.timestamp) if args.timestamp else None)
+            print("{}: {} ({} VMs, {})".format(file, "added" if added else "already stored", export['vms'], export['export_timestamp']))
+    else:
+        rolling_max_df = get_rolling_max(args.store, args.column, args.window, args.last)
+        trend_df = get_latest_vm_details(args.store).join(rolling_max_df, how='right')
+        if args.output:
+            trend_df.to_csv(args.output)
+        else:
+            print(trend_df.to_string())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import custom_functions
+
+######################
+# Custom percentiles (e.g. P90 / P99) from raw Collector performance samples (30 minute intervals)
+# The samples are streamed in chunks into one fixed-bin histogram sketch per VM & resource - the samples themselves are never held
+# in memory. Utilization is bounded (0-100 %), so 0.5 % bins give exact mergeability (sketches are added up) and a maximum
+# error of 0.25 % per percentile, independent of the number of samples.
+######################
+
+# Column names of the raw samples file (csv / csv.gz, one row per VM & interval, additional columns are ignored)
+samples_moid_column = "MOID"
+samples_value_columns = {'vCPU': "CPU %", 'vMemory': "Memory %"}
+samples_chunk_rows = 500000
+
+sketch_bins_per_percent = 2
+sketch_bin_count = 100 * sketch_bins_per_percent + 1 # bin centers 0.0, 0.5, ... 100.0
+
+# sketches of the most recently used samples files (keyed by samples & dataset content hash)
+percentile_sketches_cache = OrderedDict()
+percentile_sketches_cache_max_entries = 4
+percentile_sketches_cache_lock = threading.Lock()
+# datasets with custom percentile columns, shared by all sessions (keyed by dataset hash, sketches hash & percentile)
+custom_percentile_datasets = OrderedDict()
+custom_percentile_datasets_max_entries = 8
+custom_percentile_datasets_lock = threading.Lock()
+
+# Stream samples file into per VM histogram sketches for the given MOIDs (samples of unknown VMs are skipped)
+def build_percentile_sketches(samples_file, moids):
+
+    moid_index = pd.Index(moids).drop_duplicates()
+    sketches = {'moids': moid_index, 'samples': 0, 'skipped_samples': 0}
+    for resource in samples_value_columns:
+        sketches[resource] = np.zeros((len(moid_index), sketch_bin_count), dtype=np.uint32)
+
+    for chunk in pd.read_csv(samples_file, usecols=[samples_moid_column] + list(samples_value_columns.values()), chunksize=samples_chunk_rows, compression=get_samples_compression(samples_file)):
+        rows = moid_index.get_indexer(chunk[samples_moid_column])
+        sketches['samples'] += int(len(chunk))
+        sketches['skipped_samples'] += int((rows < 0).sum())
+        for resource, column in samples_value_columns.items():
+            values = pd.to_numeric(chunk[column], errors='coerce').to_numpy(dtype=np.float64)
+            valid = (rows >= 0) & ~np.isnan(values)
+            bins = np.clip(np.rint(values[valid] * sketch_bins_per_percent), 0, sketch_bin_count - 1).astype(np.int64)
+            # count (VM, bin) pairs of this chunk only - memory stays proportional to the chunk size
+            cells, cell_counts = np.unique(rows[valid] * sketch_bin_count + bins, return_counts=True)
+            sketches[resource].reshape(-1)[cells] += cell_counts.astype(np.uint32)
+
+    return sketches
+
+# Uploaded files have no file name pandas could infer the compression from - check for the gzip magic bytes instead
+def get_samples_compression(samples_file):
+
+    if not hasattr(samples_file, 'read'):
+        return 'infer'
+    samples_file.seek(0)
+    magic_bytes = samples_file.read(2)
+    samples_file.seek(0)
+
+    return 'gzip' if magic_bytes == b'\x1f\x8b' else None
+
+# Merge two sketches (e.g. samples of two time windows) - counts of identical VMs are added up
+def merge_percentile_sketches(sketches_a, sketches_b):
+
+    moid_index = sketches_a['moids'].union(sketches_b['moids'], sort=False)
+    merged_sketches = {'moids': moid_index, 'samples': sketches_a['samples'] + sketches_b['samples'], 'skipped_samples': sketches_a['skipped_samples'] + sketches_b['skipped_samples']}
+    for resource in samples_value_columns:
+        merged_sketches[resource] = np.zeros((len(moid_index), sketch_bin_count), dtype=np.uint32)
+        merged_sketches[resource][moid_index.get_indexer(sketches_a['moids'])] += sketches_a[resource]
+        merged_sketches[resource][moid_index.get_indexer(sketches_b['moids'])] += sketches_b[resource]
+
+    return merged_sketches
+
+# Percentile (nearest rank) per VM from the sketch counts - NaN for VMs without samples
+def get_percentile_values(sketch_counts, percentile):
+
+    sample_counts = sketch_counts.sum(axis=1, dtype=np.int64)
+    target_ranks = np.maximum(np.ceil(sample_counts * (percentile / 100)), 1)
+    cumulative_counts = np.cumsum(sketch_counts, axis=1, dtype=np.int64)
+    percentile_bins = (cumulative_counts < target_ranks[:, None]).sum(axis=1) # first bin reaching the rank
+    percentile_values = (percentile_bins / sketch_bins_per_percent).astype(np.float32)
+
+    return np.where(sample_counts > 0, percentile_values, np.float32(np.nan))
+
+# Name of the performance type for a custom percentile, e.g. 90 -> "P90", 99.5 -> "P99.5"
+def get_percentile_performance_type(percentile):
+    return "P{:g}".format(percentile)
+
+# Get sketches for samples file & dataset - only built once per content hash (samples_hash can be passed if already known)
+def get_percentile_sketches(samples_file, main_df, samples_hash=None):
+
+    cache_key = (samples_hash or custom_functions.get_file_hash(samples_file)) + "-" + str(main_df.attrs.get('file_hash'))
+    with percentile_sketches_cache_lock:
+        sketches = percentile_sketches_cache.get(cache_key)
+        if sketches is not None:
+            percentile_sketches_cache.move_to_end(cache_key)
+            return sketches
+
+    sketches = build_percentile_sketches(samples_file, main_df.index)
+    sketches['hash'] = cache_key
+    with percentile_sketches_cache_lock:
+        percentile_sketches_cache[cache_key] = sketches
+        while len(percentile_sketches_cache) > percentile_sketches_cache_max_entries:
+            percentile_sketches_cache.popitem(last=False) # evict least recently used
+
+    return sketches
+
+# Add "%" & "#" columns of a custom percentile to main_df - sized with the same rules as the Collector percentages
+def add_custom_percentile_columns(main_df, sketches, percentile):
+
+    performance_type = get_percentile_performance_type(percentile)
+    sketch_rows = sketches['moids'].get_indexer(main_df.index)
+    has_sketch = sketch_rows >= 0
+    new_columns = {}
+    for resource, provisioned_column in [('vCPU', 'vCPUs'), ('vMemory', 'vMemory Size (GiB)')]:
+        percentile_values = np.full(len(main_df), np.nan, dtype=np.float32)
+        percentile_values[has_sketch] = get_percentile_values(sketches[resource][sketch_rows[has_sketch]], percentile)
+        provisioned_values = main_df[provisioned_column].to_numpy(dtype=np.float64, na_value=np.nan)
+        if resource == 'vCPU':
+            total_values = custom_functions.get_vCPU_total_values_vectorized(provisioned_values, percentile_values)
+        else:
+            total_values = custom_functions.get_vMemory_total_values_vectorized(provisioned_values, percentile_values)
+        new_columns[resource + ' ' + performance_type + ' %'] = percentile_values
+        new_columns[resource + ' ' + performance_type + ' #'] = pd.Series(total_values, index=main_df.index).astype(main_df[resource + ' Peak #'].dtype)
+
+    # the columns of main_df are referenced, not copied (like main_df itself the result must not be modified in place)
+    custom_percentile_df = pd.DataFrame({**{column: main_df[column] for column in main_df.columns}, **new_columns}, index=main_df.index, copy=False)
+    # derived caches (aggregation cube) must not mix up datasets with different custom percentiles
+    custom_percentile_df.attrs['file_hash'] = str(main_df.attrs.get('file_hash')) + "-" + sketches.get('hash', '')[:16] + "-" + performance_type
+
+    return custom_percentile_df
+
+# Get main_df with custom percentile columns - only built once per dataset, sketches & percentile
+def get_custom_percentile_df(main_df, sketches, percentile):
+
+    cache_key = (str(main_df.attrs.get('file_hash')), sketches.get('hash'), percentile)
+    with custom_percentile_datasets_lock:
+        custom_percentile_df = custom_percentile_datasets.get(cache_key)
+        if custom_percentile_df is not None:
+            custom_percentile_datasets.move_to_end(cache_key)
+            return custom_percentile_df
+
+    custom_percentile_df = add_custom_percentile_columns(main_df, sketches, percentile)
+    with custom_percentile_datasets_lock:
+        custom_percentile_datasets[cache_key] = custom_percentile_df
+        while len(custom_percentile_datasets) > custom_percentile_datasets_max_entries:
+            custom_percentile_datasets.popitem(last=False) # evict least recently used
+
+    return custom_percentile_df
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+import export_diff
+
+
+def make_export_df(vms):
+    export_df = pd.DataFrame(vms, columns=['MOID', 'VM Name', 'Cluster Name', 'vCPUs', 'vMemory Size (GiB)']).set_index('MOID')
+    for resource in ['vCPU', 'vMemory']:
+        export_df[resource + ' 95th Percentile %'] = 50.0
+    export_df['vCPU 95th Percentile #'] = np.ceil(export_df['vCPUs'] * 0.6)
+    export_df['vMemory 95th Percentile #'] = export_df['vMemory Size (GiB)'] * 0.6
+    return export_df
+
+
+def test_vm_moved_between_clusters():
+    before_df = make_export_df([('vm-1', 'small', 'A', 4, 8.0), ('vm-2', 'large', 'A', 8, 16.0)])
+    after_df = make_export_df([('vm-1', 'small', 'A', 4, 8.0), ('vm-2', 'large', 'B', 8, 16.0)])
+    vm_diff_df, cluster_diff_df = export_diff.get_export_diff(before_df, after_df)
+
+    assert list(vm_diff_df['Status']) == ['unchanged', 'unchanged']
+    assert list(vm_diff_df['Cluster Name Before']) == ['A', 'A']
+    assert list(vm_diff_df['Cluster Name After']) == ['A', 'B']
+    assert cluster_diff_df.loc['A', ['VMs Before', 'VMs After', 'vCPUs Before', 'vCPUs After', 'vCPUs Delta']].tolist() == [2, 1, 12, 4, -8]
+    assert cluster_diff_df.loc['B', ['VMs Before', 'VMs After', 'vCPUs Before', 'vCPUs After', 'vCPUs Delta']].tolist() == [0, 1, 0, 8, 8]
+
+
+def test_added_removed_and_resized_vms():
+    before_df = make_export_df([('vm-1', 'a', 'A', 4, 8.0), ('vm-2', 'b', 'A', 8, 16.0), ('vm-3', 'c', 'B', 2, 4.0)])
+    after_df = make_export_df([('vm-3', 'c', 'B', 2, 4.0), ('vm-1', 'a', 'A', 2, 8.0), ('vm-4', 'd', 'C', 1, 2.0)])
+    vm_diff_df = export_diff.diff_exports(before_df, after_df)
+    cluster_diff_df = export_diff.diff_clusters(vm_diff_df)
+
+    assert vm_diff_df['Status'].to_dict() == {'vm-1': 'resized', 'vm-2': 'removed', 'vm-3': 'unchanged', 'vm-4': 'added'}
+    assert vm_diff_df.loc['vm-1', 'vCPUs Delta'] == -2
+    assert cluster_diff_df['VMs Before'].sum() == len(before_df) and cluster_diff_df['VMs After'].sum() == len(after_df)
+    assert cluster_diff_df[['VMs Added', 'VMs Removed', 'VMs Resized']].sum().tolist() == [1, 1, 1]
+    assert cluster_diff_df['vCPUs Delta'].sum() == after_df['vCPUs'].sum() - before_df['vCPUs'].sum()
@@ -0,0 +1,30 @@
+import os
+import statistics
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks')) # the benchmark scripts are no package
+import import_time_check
+
+import_budget_ms = float(os.environ.get("VM_RIGHT_SIZING_IMPORT_BUDGET_MS", "250"))
+import_runs = 5
+
+
+@pytest.fixture(scope='module')
+def import_measurements():
+    # fresh interpreters - sys.modules of the test process is already populated by other tests
+    return [import_time_check.measure_import(import_time_check.checked_modules) for _ in range(import_runs)]
+
+
+@pytest.mark.parametrize('lazy_module', ['plotly', 'openpyxl', 'xlsxwriter'])
+def test_app_modules_do_not_import_lazy_modules(import_measurements, lazy_module):
+    assert lazy_module not in import_measurements[0][1]
+
+
+def test_app_modules_import_time_within_budget(import_measurements):
+    baseline_seconds = statistics.median(import_time_check.measure_import(import_time_check.baseline_modules)[0] for _ in range(import_runs))
+    module_seconds = statistics.median(seconds for seconds, _ in import_measurements)
+
+    overhead_ms = (module_seconds - baseline_seconds) * 1000
+    assert overhead_ms <= import_budget_ms, "app modules import {:.0f} ms on top of pandas / numpy / pyarrow (budget: {:.0f} ms)".format(overhead_ms, import_budget_ms)
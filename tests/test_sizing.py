@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+import custom_functions
+
+
+def make_random_sizing_input(seed, rows=2000):
+    rng = np.random.default_rng(seed)
+    vCPUs = rng.integers(1, 65, rows).astype(np.float64)
+    vMemory_values = np.round(rng.choice([0.25, 0.5, 0.75, 1, 2, 4, 8, 16, 64, 512], rows) * rng.uniform(0.5, 1.5, rows), 2) # incl. VMs below 1 GiB
+    perf_values = rng.uniform(0, 150, rows) # incl. utilization above 100 %
+    perf_values[rng.random(rows) < 0.1] = np.nan
+    perf_values[rng.random(rows) < 0.05] = 0
+    perf_values[rng.random(rows) < 0.05] = 100
+    return vCPUs, vMemory_values, perf_values
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_vCPU_total_values_vectorized_matches_scalar(seed):
+    vCPUs, _, perf_values = make_random_sizing_input(seed)
+
+    expected = [custom_functions.get_vCPU_total_values({'vCPUs': vCPU, 'vCPU %': perf_value}, 'vCPU %') for vCPU, perf_value in zip(vCPUs, perf_values)]
+
+    np.testing.assert_array_equal(custom_functions.get_vCPU_total_values_vectorized(vCPUs, perf_values), expected)
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_vMemory_total_values_vectorized_matches_scalar(seed):
+    _, vMemory_values, perf_values = make_random_sizing_input(seed)
+
+    expected = [custom_functions.get_vMemory_total_values({'vMemory Size (GiB)': vMemory_value, 'vMemory %': perf_value}, 'vMemory %') for vMemory_value, perf_value in zip(vMemory_values, perf_values)]
+
+    np.testing.assert_array_equal(custom_functions.get_vMemory_total_values_vectorized(vMemory_values, perf_values), expected)
+
+
+def test_total_values_vectorized_edge_cases():
+    # no data, 0 %, above 100 %, below the 1 vCPU / 1 GiB minimum, VM smaller than 1 GiB
+    vCPUs = np.array([4, 4, 4, 16, 2])
+    vMemory_values = np.array([8, 8, 8, 16, 0.5])
+    perf_values = np.array([np.nan, 0, 150, 1, 50])
+
+    np.testing.assert_array_equal(custom_functions.get_vCPU_total_values_vectorized(vCPUs, perf_values), [4, 1, 4, 1, 2])
+    np.testing.assert_array_equal(custom_functions.get_vMemory_total_values_vectorized(vMemory_values, perf_values), [8, 1, 8, 1, 0.5])
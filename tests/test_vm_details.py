@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import custom_functions
+
+
+def make_vm_details_df():
+    main_df = pd.DataFrame({
+        'VM Name': pd.array(['vm-c', None, 'vm-a', 'vm-b', None], dtype=pd.ArrowDtype(custom_functions.pa.string())),
+        'Cluster Name': pd.Categorical(['B', 'A', 'B', 'A', 'B']),
+        'Power State': pd.Categorical(['poweredOn'] * 5),
+        'vCPUs': pd.array([4, pd.NA, 2, 4, 8], dtype='Int16'),
+        'vCPU 95th Percentile %': np.array([np.nan, 10.0, 50.0, 10.0, np.nan], dtype=np.float32),
+    }, index=pd.Index(['vm-1', 'vm-2', 'vm-3', 'vm-4', 'vm-5'], name='MOID'))
+    return main_df
+
+
+@pytest.mark.parametrize('sort_column', ['vCPUs', 'VM Name', 'vCPU 95th Percentile %', 'Cluster Name'])
+@pytest.mark.parametrize('ascending', [True, False])
+def test_sort_order_keeps_empty_values_last(sort_column, ascending):
+    main_df = make_vm_details_df()
+    sort_order = custom_functions.get_vm_details_sort_order(main_df, sort_column, ascending)
+
+    expected_df = main_df.sort_values(sort_column, ascending=ascending, kind='stable', na_position='last')
+    assert list(main_df.index[sort_order]) == list(expected_df.index)
+    sorted_values = main_df[sort_column].iloc[sort_order]
+    assert not sorted_values.iloc[:sorted_values.notna().sum()].isna().any() # empty values only at the end
+
+
+def test_sort_order_nullable_int_ascending_na_last():
+    main_df = make_vm_details_df()
+    sort_order = custom_functions.get_vm_details_sort_order(main_df, 'vCPUs', True)
+
+    assert list(sort_order) == [2, 0, 3, 4, 1]
+
+
+def test_vm_details_rows_filter_search_and_sort():
+    main_df = make_vm_details_df()
+    row_positions = custom_functions.get_vm_details_rows(main_df, ['B'], ['poweredOn'], 'vCPUs', False, 'VM-')
+
+    assert list(row_positions) == [0, 2] # vm-5 has no name, cluster A is filtered out